@@ -110,7 +110,8 @@ bool checkCardInAPI(String uid) {
   WiFiClient client;
   HTTPClient http;
 
-  String url = String(api_server) + "/api/nfc/validate/" + uid;
+  // Modo compacto: a API responde só "1" (autorizado) ou "0" (negado)
+  String url = String(api_server) + "/api/nfc/validate/" + uid + "?format=compact";
 
   Serial.println("Verificando cartão na API...");
   Serial.println("URL: " + url);
@@ -130,24 +131,11 @@ bool checkCardInAPI(String uid) {
 
   Serial.printf("Código HTTP recebido: %d\n", httpCode);
 
-  // ←← Aqui estava o problema!
+  // Resposta de 1 byte ("1"/"0"): dispensa o documento JSON de 1024 bytes
   String payload = http.getString();
   http.end();
 
-  Serial.println("DEBUG JSON recebido:");
-  Serial.println(payload);
-
-  // JSON da sua API é grande → precisa de documento maior
-  StaticJsonDocument<1024> json;
-
-  DeserializationError err = deserializeJson(json, payload);
-  if (err) {
-    Serial.print("Erro ao decodificar JSON: ");
-    Serial.println(err.f_str());
-    return false;
-  }
-
-  bool authorized = json["authorized"] | false;
+  bool authorized = (httpCode == 200 && payload.charAt(0) == '1');
 
   if (authorized) {
     Serial.println("✓ Cartão autorizado!");
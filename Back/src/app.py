@@ -1,9 +1,27 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
-from models.user import db, User
+from models.user import db, User, BRT, get_brt_now, WITH_NFC, WITHOUT_NFC
 from models.log import Log
 from models.pairing import PairingSession
+from models.allowlist_change import AllowlistChange
+from models.denied_card_stat import DeniedCardStat
+from models.daily_access_rollup import DailyAccessRollup
+from services.auth_cache import auth_cache
+from services.log_writer import log_writer
+from services.bloom import allowlist_blooms
+from services.debounce import swipe_debouncer
+from services.event_stream import event_broker
+from services.ttl_cache import stats_cache
+from migrations import upgrade
+import query_plans
+from sqlalchemy import insert, text
+from sqlalchemy.exc import IntegrityError
+import base64
+import csv
+import gzip
+import io
+import json
 import os
 import re
 
@@ -12,15 +30,110 @@ CORS(app)  # Habilita CORS para todas as rotas
 
 # Configuração do banco de dados
 basedir = os.path.abspath(os.path.dirname(__file__))
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'database.sqlite')
+# DATABASE_URL/LOG_SPOOL_DIR permitem apontar para outro banco (ex.: check_query_plans.py)
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+    'DATABASE_URL', 'sqlite:///' + os.path.join(basedir, 'database.sqlite')
+)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Gravação em lote (write-behind) dos logs de acesso, via spool em disco
+app.config['LOG_WRITER_BATCH_SIZE'] = 200          # máximo de logs por transação
+app.config['LOG_WRITER_FLUSH_INTERVAL_MS'] = 50    # intervalo entre fsyncs/cargas do spool
+app.config['LOG_WRITER_STOP_TIMEOUT'] = 5          # segundos tentando carregar o spool no desligamento
+app.config['LOG_SPOOL_DIR'] = os.environ.get('LOG_SPOOL_DIR', os.path.join(basedir, 'spool'))
+app.config['LOG_SPOOL_SEGMENT_BYTES'] = 4 * 1024 * 1024
+
+# Limite de eventos por requisição em /api/nfc/validate/batch
+app.config['NFC_BATCH_MAX_EVENTS'] = 10000
+# Limite de pares (cpf, cartão) por requisição em /api/nfc/link/bulk
+app.config['NFC_LINK_BULK_MAX_ROWS'] = 100000
+
+# Cache negativo de UUIDs não cadastrados (validação sem consultar `users`)
+app.config['NFC_NEGATIVE_CACHE_SIZE'] = 10000
+app.config['NFC_NEGATIVE_CACHE_TTL'] = 30          # segundos
+# Intervalo de leitura do changelog da allowlist para invalidar o cache
+# (alterações feitas por outros workers)
+app.config['NFC_CACHE_SYNC_INTERVAL'] = 1          # segundos
+
+# Tentativas negadas (ACCESS_DENIED, SYNC_NO_SESSION) são agregadas em
+# denied_card_stats por janela; só as primeiras de cada janela vão para logs
+app.config['DENIED_STATS_BUCKET_SECONDS'] = 3600
+app.config['DENIED_STATS_KEEP_FIRST'] = 5
+
+# Janela de debounce para leituras repetidas do mesmo cartão (0 desativa)
+app.config['NFC_DEBOUNCE_MS'] = 1500
+
+# Stream de eventos (SSE): retomada via Last-Event-ID e limite por cliente
+app.config['SSE_REPLAY_BUFFER'] = 1000
+app.config['SSE_CLIENT_QUEUE_SIZE'] = 256
+app.config['SSE_KEEPALIVE_SECONDS'] = 15
+app.config['SSE_TAIL_INTERVAL'] = 0.25            # segundos entre leituras dos eventos novos no banco
+
+# Cache das estatísticas agregadas (expira pelo TTL; não é invalidado nos commits,
+# que com tráfego de leituras acontecem a cada carga do spool)
+app.config['STATS_CACHE_TTL'] = 5                  # segundos
+app.config['STATS_HISTOGRAM_MAX_BUCKETS'] = 500
+
+# Paginação de /api/logs
+app.config['LOGS_PAGE_SIZE'] = 100
+app.config['LOGS_MAX_PAGE_SIZE'] = 1000
+app.config['LOGS_EXPORT_BATCH_SIZE'] = 1000        # linhas por consulta na exportação
+
+# Paginação de /api/users
+app.config['USERS_PAGE_SIZE'] = 100
+app.config['USERS_MAX_PAGE_SIZE'] = 1000
+app.config['USERS_SEARCH_MAX_RESULTS'] = 100
+app.config['USERS_BULK_MAX_ROWS'] = 100000
+app.config['USERS_BULK_CHUNK_SIZE'] = 5000         # usuários por transação no cadastro em lote
+
+# Taxa padrão de falsos positivos do Bloom filter da allowlist
+app.config['NFC_BLOOM_FP_RATE'] = 0.01
+
 # Inicializar banco de dados
 db.init_app(app)
 
-# Criar tabelas
+# Criar tabelas e aquecer o cache de autorização dos cartões NFC
 with app.app_context():
     db.create_all()
+    upgrade(db)
+
+    # Bancos anteriores ao changelog da allowlist: registrar os cartões atuais
+    if not db.session.query(AllowlistChange.version).first():
+        for (card_uuid,) in db.session.query(User.nfc_card_uuid).filter(User.nfc_card_uuid.isnot(None)):
+            AllowlistChange.record(None, card_uuid)
+        db.session.commit()
+
+    auth_cache.init_app(app)
+
+    # Bancos anteriores ao rollup por tentativas (user_version 1): recalcular
+    # a partir de logs e denied_card_stats
+    if db.session.execute(text('PRAGMA user_version')).scalar() < 1:
+        DailyAccessRollup.rebuild()
+        db.session.execute(text('PRAGMA user_version = 1'))
+        db.session.commit()
+
+log_writer.init_app(app)
+swipe_debouncer.init_app(app, emit=log_writer.submit_repeats)
+log_writer.add_tick(swipe_debouncer.sweep)
+log_writer.add_tick(auth_cache.sync)
+event_broker.init_app(app)
+log_writer.add_tick(event_broker.tail)
+
+stats_cache.ttl = app.config['STATS_CACHE_TTL']
+
+@app.cli.command('rebuild-rollup')
+def rebuild_rollup():
+    """Recalcula a tabela daily_access_rollup a partir dos logs e de denied_card_stats"""
+    DailyAccessRollup.rebuild()
+    db.session.commit()
+    print(f'{DailyAccessRollup.query.count()} linhas em daily_access_rollup')
+
+@app.cli.command('query-plans')
+def query_plans_report():
+    """Mostra o EXPLAIN QUERY PLAN das consultas das rotas (sai com 1 se alguma não usar índice)"""
+    failures = query_plans.report()
+    if failures:
+        raise SystemExit(1)
 
 def validate_cpf(cpf):
     """Valida formato do CPF (apenas números, 11 dígitos)"""
@@ -33,6 +146,125 @@ def validate_email(email):
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
     return re.match(pattern, email) is not None
 
+# Mensagens das restrições UNIQUE de `users` (as mesmas das validações antigas)
+USER_UNIQUE_ERRORS = {
+    'users.cpf': ('CPF já cadastrado', 400),
+    'users.email': ('Email já cadastrado', 400),
+    'users.nfc_card_uuid': ('UUID do cartão NFC já está registrado em outro usuário', 409),
+}
+
+def unique_violation_response(error, messages=USER_UNIQUE_ERRORS):
+    """Converte o IntegrityError de uma restrição UNIQUE na resposta de erro da rota
+
+    As rotas de escrita não consultam antes se o valor está livre: o banco
+    recusa a duplicata na mesma transação, sem a corrida entre verificação e escrita.
+    """
+    match = re.search(r'UNIQUE constraint failed: (\w+\.\w+)', str(error.orig))
+    if match and match.group(1) in messages:
+        message, status = messages[match.group(1)]
+        return jsonify({'error': message}), status
+    return jsonify({'error': str(error)}), 500
+
+def encode_cursor(*values):
+    """Cursor opaco de paginação a partir da chave de ordenação do último item"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor):
+    """Inverso de encode_cursor; ValueError se o cursor for inválido"""
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError('cursor inválido')
+
+def parse_date_param(value, name):
+    """Converte um parâmetro de data/hora ISO-8601 da query (ValueError se inválido)
+
+    Retorna o horário local (BRT) sem fuso, como os logs são gravados: valores
+    com offset (ex.: `+00:00` ou `Z`) são convertidos; sem offset já são BRT.
+    """
+    from datetime import datetime
+    try:
+        if value.endswith(('Z', 'z')):
+            value = value[:-1] + '+00:00'
+        parsed = datetime.fromisoformat(value)
+    except (AttributeError, TypeError, ValueError):
+        raise ValueError(f'{name} inválido (use ISO-8601, ex.: 2024-11-30 ou 2024-11-30T15:00:00)')
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(BRT).replace(tzinfo=None)
+    return parsed
+
+def parse_log_filters(args):
+    """Lê os filtros de logs da query string (ValueError se algum for inválido)
+
+    Filtros: user_id, nfc_uuid, action (repetível ou separado por vírgula),
+    from (inclusivo) e to (exclusivo). Retorna (critérios, ações): as ações
+    ficam de fora dos critérios para que cada uma use o índice (action, timestamp).
+    """
+    criteria = []
+    if 'user_id' in args:
+        try:
+            criteria.append(Log.user_id == int(args['user_id']))
+        except ValueError:
+            raise ValueError('user_id deve ser um número inteiro')
+    if args.get('nfc_uuid'):
+        criteria.append(Log.nfc_uuid == args['nfc_uuid'])
+    if 'from' in args:
+        criteria.append(Log.timestamp >= parse_date_param(args['from'], 'from'))
+    if 'to' in args:
+        criteria.append(Log.timestamp < parse_date_param(args['to'], 'to'))
+
+    actions = []
+    for value in args.getlist('action'):
+        actions.extend(action.strip() for action in value.split(',') if action.strip())
+    return criteria, sorted(set(actions))
+
+def parse_reader_ts(value):
+    """Converte o horário informado pelo leitor (epoch em segundos ou ISO-8601)"""
+    from datetime import datetime
+    if value is None:
+        return get_brt_now()
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime.fromtimestamp(value, BRT)
+    if isinstance(value, str):
+        ts = datetime.fromisoformat(value)
+        # Com offset: convertido para BRT, o fuso em que os logs são gravados
+        return ts.astimezone(BRT) if ts.tzinfo else ts.replace(tzinfo=BRT)
+    raise ValueError('reader_ts inválido')
+
+def read_bulk_records(key):
+    """Lê os registros de uma importação em lote (ValueError se o corpo for inválido)
+
+    Aceita uma lista JSON (ou { key: [...] }) ou CSV com cabeçalho
+    (Content-Type: text/csv), lido em streaming; ambos com Content-Encoding: gzip.
+    """
+    gzipped = request.headers.get('Content-Encoding', '').lower() == 'gzip'
+    if request.mimetype == 'text/csv':
+        stream = gzip.GzipFile(fileobj=request.stream) if gzipped else request.stream
+        return csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+
+    body = request.get_data()
+    if gzipped:
+        try:
+            body = gzip.decompress(body)
+        except (OSError, EOFError):
+            raise ValueError('Corpo gzip inválido')
+    try:
+        data = json.loads(body)
+    except ValueError:
+        raise ValueError('JSON inválido')
+    records = data.get(key) if isinstance(data, dict) else data
+    if not isinstance(records, list):
+        raise ValueError(f'{key} deve ser uma lista')
+    return records
+
+def in_json_array(column, values):
+    """Critério `column IN (...)` com os valores em um único parâmetro JSON
+
+    O json_each evita o limite de variáveis do SQLite em lotes grandes.
+    """
+    candidates = db.func.json_each(json.dumps(list(values))).table_valued('value')
+    return column.in_(db.select(candidates.c.value))
+
 @app.route('/')
 def hello_world():
     return '<h1>API de Usuários - INE5670</h1>'
@@ -60,14 +292,7 @@ def create_user():
         # Limpar CPF (remover pontos e traços)
         cpf_clean = re.sub(r'[^0-9]', '', data['cpf'])
         
-        # Verificar se CPF já existe
-        if User.query.filter_by(cpf=cpf_clean).first():
-            return jsonify({'error': 'CPF já cadastrado'}), 400
-        
-        # Verificar se email já existe
-        if User.query.filter_by(email=data['email']).first():
-            return jsonify({'error': 'Email já cadastrado'}), 400
-        
+        # CPF/email duplicados são recusados pelas restrições UNIQUE no commit
         # Criar usuário com nfc_card_uuid = None (null)
         user = User(
             name=data['name'],
@@ -85,23 +310,252 @@ def create_user():
             'user': user.to_dict()
         }), 201
         
+    except IntegrityError as e:
+        db.session.rollback()
+        return unique_violation_response(e)
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
     
+# Rota para criar usuários em lote
+@app.route('/api/users/bulk', methods=['POST'])
+def create_users_bulk():
+    """
+    Body: [ { "name": "...", "cpf": "...", "email": "...", "phone": "..." }, ... ]
+    (ou { "users": [...] }), ou CSV (Content-Type: text/csv) com cabeçalho
+    name,cpf,email,phone, lido em streaming; ambos aceitam Content-Encoding: gzip.
+    Valida tudo em uma passada, detecta CPF/e-mail repetidos no lote e já
+    cadastrados (uma consulta IN por chave) e insere em transações de
+    USERS_BULK_CHUNK_SIZE usuários. Retorna os erros por linha (1 = primeiro usuário).
+    """
+    try:
+        max_rows = app.config['USERS_BULK_MAX_ROWS']
+        try:
+            records = read_bulk_records('users')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Validação em uma passada; repetidos no lote ficam com a primeira ocorrência
+        errors = []
+        valid = []
+        seen_cpfs = {}
+        seen_emails = {}
+        for row, record in enumerate(records, start=1):
+            if row > max_rows:
+                return jsonify({'error': f'Máximo de {max_rows} usuários por requisição'}), 413
+            if not isinstance(record, dict):
+                errors.append({'row': row, 'error': 'Usuário deve ser um objeto'})
+                continue
+            missing = next((f for f in ('name', 'cpf', 'email', 'phone')
+                            if not isinstance(record.get(f), str) or not record[f].strip()), None)
+            if missing:
+                errors.append({'row': row, 'cpf': record.get('cpf'), 'error': f'O campo {missing} é obrigatório'})
+                continue
+            if not validate_cpf(record['cpf']):
+                errors.append({'row': row, 'cpf': record['cpf'], 'error': 'CPF inválido. Deve conter 11 dígitos numéricos'})
+                continue
+            email = record['email'].strip()
+            if not validate_email(email):
+                errors.append({'row': row, 'cpf': record['cpf'], 'error': 'Email inválido'})
+                continue
+            cpf_clean = re.sub(r'[^0-9]', '', record['cpf'])
+            if cpf_clean in seen_cpfs:
+                errors.append({'row': row, 'cpf': cpf_clean, 'error': f'CPF repetido no lote (linha {seen_cpfs[cpf_clean]})'})
+                continue
+            if email in seen_emails:
+                errors.append({'row': row, 'cpf': cpf_clean, 'error': f'Email repetido no lote (linha {seen_emails[email]})'})
+                continue
+            seen_cpfs[cpf_clean] = row
+            seen_emails[email] = row
+            valid.append((row, {
+                'name': record['name'].strip(),
+                'cpf': cpf_clean,
+                'email': email,
+                'phone': record['phone'].strip()
+            }))
+
+        def existing(column, values):
+            """Valores de `column` já cadastrados, com uma única consulta IN"""
+            if not values:
+                return set()
+            return set(db.session.scalars(db.select(column).filter(in_json_array(column, values))))
+
+        def drop_existing(pending):
+            """Remove de `pending` os usuários cujo CPF ou e-mail já está no banco"""
+            taken_cpfs = existing(User.cpf, [user['cpf'] for _, user in pending])
+            taken_emails = existing(User.email, [user['email'] for _, user in pending])
+            remaining = []
+            for row, user in pending:
+                if user['cpf'] in taken_cpfs:
+                    errors.append({'row': row, 'cpf': user['cpf'], 'error': 'CPF já cadastrado'})
+                elif user['email'] in taken_emails:
+                    errors.append({'row': row, 'cpf': user['cpf'], 'error': 'Email já cadastrado'})
+                else:
+                    remaining.append((row, user))
+            return remaining
+
+        valid = drop_existing(valid)
+
+        # Um único INSERT ... SELECT por trecho (em vez de executemany): o trigger
+        # do users_fts descarrega o índice FTS5 a cada statement
+        now = db.literal(get_brt_now(), User.created_at.type)
+        fields = ('name', 'cpf', 'email', 'phone')
+        created = 0
+        chunk_size = app.config['USERS_BULK_CHUNK_SIZE']
+        for start in range(0, len(valid), chunk_size):
+            chunk = valid[start:start + chunk_size]
+            while chunk:
+                try:
+                    source = db.func.json_each(json.dumps([user for _, user in chunk])).table_valued('value')
+                    db.session.execute(insert(User.__table__).from_select(
+                        [*fields, 'created_at', 'updated_at'],
+                        db.select(
+                            *(db.func.json_extract(source.c.value, f'$.{field}') for field in fields),
+                            now, now
+                        )
+                    ))
+                    db.session.commit()
+                    created += len(chunk)
+                    break
+                except IntegrityError:
+                    # Outro cadastro concorrente usou um CPF/e-mail do lote: reverifica só este trecho
+                    db.session.rollback()
+                    remaining = drop_existing(chunk)
+                    if len(remaining) == len(chunk):
+                        raise
+                    chunk = remaining
+
+        errors.sort(key=lambda error: error['row'])
+        return jsonify({
+            'message': f'{created} usuários criados',
+            'created': created,
+            'failed': len(errors),
+            'errors': errors
+        }), 200
+
+    except (UnicodeDecodeError, csv.Error, OSError, EOFError) as e:
+        db.session.rollback()
+        return jsonify({'error': f'Corpo da requisição inválido: {e}'}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 # Rota para Listar todos os usuários
 @app.route('/api/users', methods=['GET'])
 def list_users():
+    """
+    Query: ?limit=<n> (padrão USERS_PAGE_SIZE), ?cursor=<next_cursor>,
+    ?sort=name|created_at|updated_at (padrão created_at), ?order=asc|desc
+    e ?has_nfc=true|false.
+    Cada ordenação percorre um índice (coluna, id) a partir do cursor, que
+    guarda a ordenação usada; com has_nfc, um índice parcial da ordenação.
+    `total` conta todos os usuários do filtro e vem do cache de estatísticas,
+    que só expira pelo TTL (pode ficar até STATS_CACHE_TTL segundos defasado).
+    """
     try:
-        users = User.query.all()
+        from datetime import datetime
+        limit = request.args.get('limit', app.config['USERS_PAGE_SIZE'], type=int)
+        limit = min(max(limit, 1), app.config['USERS_MAX_PAGE_SIZE'])
+        sort = request.args.get('sort', 'created_at')
+        if sort not in ('name', 'created_at', 'updated_at'):
+            return jsonify({'error': 'sort deve ser name, created_at ou updated_at'}), 400
+        order = request.args.get('order', 'asc')
+        if order not in ('asc', 'desc'):
+            return jsonify({'error': 'order deve ser asc ou desc'}), 400
+        has_nfc = request.args.get('has_nfc')
+        if has_nfc not in (None, 'true', 'false'):
+            return jsonify({'error': 'has_nfc deve ser true ou false'}), 400
+
+        criteria = []
+        # Mesmo texto dos índices parciais de cada ordenação (models/user.py)
+        if has_nfc == 'true':
+            criteria.append(db.text(WITH_NFC))
+        elif has_nfc == 'false':
+            criteria.append(db.text(WITHOUT_NFC))
+
+        column = getattr(User, sort)
+        page_criteria = list(criteria)
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                cursor_sort, cursor_value, cursor_id = decode_cursor(cursor)
+                if cursor_sort != f'{sort}:{order}':
+                    raise ValueError('cursor de outra ordenação')
+                if sort != 'name':
+                    cursor_value = datetime.fromisoformat(cursor_value)
+            except (ValueError, TypeError):
+                return jsonify({'error': 'cursor inválido'}), 400
+            key = db.tuple_(column, User.id)
+            page_criteria.append(key > (cursor_value, cursor_id) if order == 'asc' else key < (cursor_value, cursor_id))
+
+        ordering = (column.asc(), User.id.asc()) if order == 'asc' else (column.desc(), User.id.desc())
+        users = User.query.filter(*page_criteria).order_by(*ordering).limit(limit + 1).all()
+        next_cursor = None
+        if len(users) > limit:
+            users = users[:limit]
+            last = users[-1]
+            value = getattr(last, sort)
+            next_cursor = encode_cursor(
+                f'{sort}:{order}', value if sort == 'name' else value.isoformat(), last.id
+            )
+
+        total = stats_cache.get_or_compute(
+            ('users_total', has_nfc),
+            lambda: db.session.query(db.func.count(User.id)).filter(*criteria).scalar()
+        )
         return jsonify({
             'users': [user.to_dict() for user in users],
-            'total': len(users)
+            'total': total,
+            'next_cursor': next_cursor
         }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Rota de busca de usuários por nome, e-mail, telefone ou CPF (prefixos)
+@app.route('/api/users/search', methods=['GET'])
+def search_users():
+    """
+    Query: ?q=<texto>&limit=<n> (padrão 20, máximo USERS_SEARCH_MAX_RESULTS)
+    Cada termo de `q` casa como prefixo de uma palavra do nome, do e-mail, do
+    telefone (só dígitos) ou do CPF; todos os termos precisam casar. Usa o
+    índice FTS5 users_fts (src/migrations.py) e ordena por relevância (bm25,
+    com mais peso para o nome).
+    """
+    try:
+        from sqlalchemy import text
+        q = request.args.get('q', '').strip()
+        if not q:
+            return jsonify({'error': 'q é obrigatório'}), 400
+        limit = request.args.get('limit', 20, type=int)
+        limit = min(max(limit, 1), app.config['USERS_SEARCH_MAX_RESULTS'])
+
+        # Telefones digitados com pontuação viram um único termo de dígitos
+        if re.fullmatch(r'[\d\s().+-]+', q):
+            terms = [re.sub(r'\D', '', q)]
+        else:
+            terms = re.findall(r'\w+', q)
+        if not terms or not terms[0]:
+            return jsonify({'users': [], 'total': 0}), 200
+        match = ' '.join(f'"{term}"*' for term in terms)
+
+        ids = db.session.execute(
+            text(
+                'SELECT rowid FROM users_fts WHERE users_fts MATCH :match '
+                'ORDER BY bm25(users_fts, 10.0, 5.0, 2.0, 2.0) LIMIT :limit'
+            ),
+            {'match': match, 'limit': limit}
+        ).scalars().all()
+        users = {user.id: user for user in User.query.filter(User.id.in_(ids))} if ids else {}
+
+        return jsonify({
+            'users': [users[user_id].to_dict() for user_id in ids if user_id in users],
+            'total': len(users)
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # Rota para editar usuário (por CPF)
 @app.route('/api/users/cpf/<string:cpf>', methods=['PUT'])
 def edit_user(cpf):
@@ -118,9 +572,8 @@ def edit_user(cpf):
         if not user:
             return jsonify({'error': 'Usuário não encontrado'}), 404
         
-        # Salvar CPF original para validações
-        original_cpf = user.cpf
-        original_email = user.email
+        # Salvar cartão original para o changelog da allowlist
+        original_nfc_uuid = user.nfc_card_uuid
         
         data = request.get_json()
         
@@ -133,46 +586,36 @@ def edit_user(cpf):
             if not validate_cpf(data['cpf']):
                 return jsonify({'error': 'CPF inválido. Deve conter 11 dígitos numéricos'}), 400
             
-            new_cpf_clean = re.sub(r'[^0-9]', '', data['cpf'])
-            # Verificar se o novo CPF já existe (exceto para o próprio usuário)
-            if new_cpf_clean != original_cpf:
-                existing_user = User.query.filter_by(cpf=new_cpf_clean).first()
-                if existing_user:
-                    return jsonify({'error': 'CPF já cadastrado'}), 400
-            user.cpf = new_cpf_clean
+            user.cpf = re.sub(r'[^0-9]', '', data['cpf'])
         
         # Atualizar email
         if 'email' in data:
             if not validate_email(data['email']):
                 return jsonify({'error': 'Email inválido'}), 400
-            
-            # Verificar se o novo email já existe (exceto para o próprio usuário)
-            if data['email'] != original_email:
-                existing_user = User.query.filter_by(email=data['email']).first()
-                if existing_user:
-                    return jsonify({'error': 'Email já cadastrado'}), 400
             user.email = data['email']
         
         # Atualizar telefone
         if 'phone' in data:
             user.phone = data['phone']
         
-        # Atualizar NFC UUID
+        # Atualizar NFC UUID (CPF, email e cartão duplicados são recusados no commit)
         if 'nfc_card_uuid' in data:
-            nfc_uuid = data['nfc_card_uuid']
-            if nfc_uuid:
-                existing_user = User.query.filter_by(nfc_card_uuid=nfc_uuid).first()
-                if existing_user and existing_user.id != user.id:
-                    return jsonify({'error': 'UUID do cartão NFC já cadastrado'}), 400
-            user.nfc_card_uuid = nfc_uuid
+            user.nfc_card_uuid = data['nfc_card_uuid']
         
+        AllowlistChange.record(original_nfc_uuid, user.nfc_card_uuid)
         db.session.commit()
+        auth_cache.invalidate(original_nfc_uuid, user.nfc_card_uuid)
         
         return jsonify({
             'message': 'Usuário atualizado com sucesso',
             'user': user.to_dict()
         }), 200
         
+    except IntegrityError as e:
+        db.session.rollback()
+        return unique_violation_response(e, {
+            **USER_UNIQUE_ERRORS, 'users.nfc_card_uuid': ('UUID do cartão NFC já cadastrado', 400)
+        })
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -193,8 +636,11 @@ def delete_user(cpf):
         if not user:
             return jsonify({'error': 'Usuário não encontrado'}), 404
         
+        nfc_uuid = user.nfc_card_uuid
         db.session.delete(user)
+        AllowlistChange.record(nfc_uuid, None)
         db.session.commit()
+        auth_cache.invalidate(nfc_uuid)
         
         return jsonify({
             'message': 'Usuário deletado com sucesso'
@@ -254,18 +700,10 @@ def link_nfc_to_user():
                 'nfc_card_uuid': user.nfc_card_uuid
             }), 409
         
-        # Verificar se UUID já está registrado em outro usuário
-        other_user = User.query.filter_by(nfc_card_uuid=nfc_uuid).first()
-        if other_user:
-            return jsonify({
-                'error': 'UUID do cartão NFC já está registrado em outro usuário'
-            }), 409
-        
-        # Vincular cartão ao usuário
+        # Vincular cartão ao usuário e gravar o log na mesma transação
+        # (UUID já registrado em outro usuário é recusado pela restrição UNIQUE)
         user.nfc_card_uuid = nfc_uuid
-        db.session.commit()
-        
-        # Gravar log
+        AllowlistChange.record(None, nfc_uuid)
         log = Log(
             user_id=user.id,
             nfc_uuid=nfc_uuid,
@@ -273,7 +711,10 @@ def link_nfc_to_user():
             action='LINK'
         )
         db.session.add(log)
+        db.session.flush()
+        DailyAccessRollup.add([log])
         db.session.commit()
+        auth_cache.invalidate(nfc_uuid)
         
         return jsonify({
             'message': 'Cartão NFC vinculado com sucesso',
@@ -281,6 +722,158 @@ def link_nfc_to_user():
             'log_id': log.id
         }), 200
         
+    except IntegrityError as e:
+        db.session.rollback()
+        return unique_violation_response(e)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+# Rota para VINCULAR em lote cartões a usuários (ex.: lote de cartões pré-impressos)
+@app.route('/api/nfc/link/bulk', methods=['POST'])
+def link_nfc_bulk():
+    """
+    Body: [ { "cpf": "...", "nfc_card_uuid": "..." }, ... ] (ou { "links": [...] }),
+    ou CSV (Content-Type: text/csv) com cabeçalho cpf,nfc_card_uuid.
+    Verifica os conflitos com users.cpf e users.nfc_card_uuid com uma consulta
+    IN por chave, aplica todos os vínculos e grava os logs LINK (um insert em
+    lote) em uma única transação. Retorna um resultado por linha, na mesma ordem.
+    """
+    try:
+        max_rows = app.config['NFC_LINK_BULK_MAX_ROWS']
+        try:
+            records = read_bulk_records('links')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Validação em uma passada; repetidos no lote ficam com a primeira ocorrência
+        results = []
+        pending = []
+        seen_cpfs = {}
+        seen_uuids = {}
+        for row, record in enumerate(records, start=1):
+            if row > max_rows:
+                return jsonify({'error': f'Máximo de {max_rows} vínculos por requisição'}), 413
+            cpf = record.get('cpf') if isinstance(record, dict) else None
+            nfc_uuid = record.get('nfc_card_uuid') if isinstance(record, dict) else None
+            if not isinstance(cpf, str) or not isinstance(nfc_uuid, str) or not cpf.strip() or not nfc_uuid.strip():
+                results.append({'row': row, 'cpf': cpf, 'nfc_card_uuid': nfc_uuid,
+                                'status': 'error', 'error': 'nfc_card_uuid e cpf são obrigatórios'})
+                continue
+            result = {'row': row, 'cpf': re.sub(r'[^0-9]', '', cpf), 'nfc_card_uuid': nfc_uuid.strip()}
+            results.append(result)
+            if result['cpf'] in seen_cpfs:
+                result.update(status='error', error=f'CPF repetido no lote (linha {seen_cpfs[result["cpf"]]})')
+            elif result['nfc_card_uuid'] in seen_uuids:
+                result.update(status='error', error=f'UUID repetido no lote (linha {seen_uuids[result["nfc_card_uuid"]]})')
+            else:
+                seen_cpfs[result['cpf']] = row
+                seen_uuids[result['nfc_card_uuid']] = row
+                pending.append(result)
+
+        def link(pending):
+            """Aplica os vínculos sem conflito; retorna os logs LINK gravados
+
+            Levanta IntegrityError se outro usuário recebeu um dos cartões depois
+            da verificação (a chamada seguinte a refaz e marca as linhas afetadas).
+            """
+            for result in pending:
+                for key in ('error', 'current_nfc_card_uuid', 'log_id'):
+                    result.pop(key, None)
+            users = {
+                cpf: (user_id, current) for cpf, user_id, current in db.session.execute(
+                    db.select(User.cpf, User.id, User.nfc_card_uuid)
+                    .filter(in_json_array(User.cpf, [result['cpf'] for result in pending]))
+                )
+            }
+            taken = set(db.session.scalars(
+                db.select(User.nfc_card_uuid)
+                .filter(in_json_array(User.nfc_card_uuid, [result['nfc_card_uuid'] for result in pending]))
+            ))
+
+            links = []
+            for result in pending:
+                user_id, current = users.get(result['cpf'], (None, None))
+                if user_id is None:
+                    result.update(status='error', error='Usuário não encontrado')
+                elif current:  # '' também é "sem cartão", como em has_nfc
+                    result.update(status='error', error='Usuário já possui um cartão NFC registrado',
+                                  current_nfc_card_uuid=current)
+                elif result['nfc_card_uuid'] in taken:
+                    result.update(status='error', error='UUID do cartão NFC já está registrado em outro usuário')
+                else:
+                    result['status'] = 'linked'
+                    links.append((result, user_id))
+            if not links:
+                return []
+
+            now = get_brt_now()
+            # Só vincula quem continua sem cartão; a unicidade de nfc_card_uuid cobre o resto
+            updated = db.session.execute(
+                db.update(User.__table__)
+                .where(User.id == db.bindparam('link_user_id'), db.func.coalesce(User.nfc_card_uuid, '') == '')
+                .values(nfc_card_uuid=db.bindparam('link_nfc_uuid'), updated_at=now),
+                [{'link_user_id': user_id, 'link_nfc_uuid': result['nfc_card_uuid']} for result, user_id in links]
+            ).rowcount
+            if updated != len(links):
+                # Usuários que receberam outro cartão depois da verificação: erro só nessas linhas
+                current = dict(db.session.execute(
+                    db.select(User.id, User.nfc_card_uuid)
+                    .filter(in_json_array(User.id, [user_id for _, user_id in links]))
+                ).all())
+                lost = [(result, user_id) for result, user_id in links if current.get(user_id) != result['nfc_card_uuid']]
+                for result, user_id in lost:
+                    result.update(status='error', error='Usuário já possui um cartão NFC registrado',
+                                  current_nfc_card_uuid=current.get(user_id))
+                links = [link for link in links if link not in lost]
+                if not links:
+                    return []
+
+            db.session.execute(insert(AllowlistChange.__table__), [
+                {'nfc_uuid': result['nfc_card_uuid'], 'op': 'ADD', 'created_at': now} for result, _ in links
+            ])
+            table = Log.__table__
+            rows = db.session.execute(
+                insert(table).returning(*table.c, sort_by_parameter_order=True),
+                [
+                    {'user_id': user_id, 'nfc_uuid': result['nfc_card_uuid'], 'user_exists': True,
+                     'action': 'LINK', 'timestamp': now}
+                    for result, user_id in links
+                ]
+            )
+            logs = [Log(**row._mapping) for row in rows]
+            for (result, _), log in zip(links, logs):
+                result['log_id'] = log.id
+            DailyAccessRollup.add(logs)
+            return logs
+
+        # Um vínculo concorrente entre a verificação e o UPDATE refaz a verificação
+        logs = []
+        for attempt in range(3):
+            try:
+                logs = link(pending) if pending else []
+                db.session.commit()
+                break
+            except IntegrityError:
+                db.session.rollback()
+                if attempt == 2:
+                    raise
+
+        if logs:
+            auth_cache.invalidate(*(log.nfc_uuid for log in logs))
+
+        linked = len(logs)
+        return jsonify({
+            'message': f'{linked} cartões vinculados',
+            'linked': linked,
+            'failed': len(results) - linked,
+            'results': results
+        }), 200
+
+    except (UnicodeDecodeError, csv.Error, OSError, EOFError) as e:
+        db.session.rollback()
+        return jsonify({'error': f'Corpo da requisição inválido: {e}'}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -289,46 +882,215 @@ def link_nfc_to_user():
 # Rota para VALIDAR cartão NFC 
 @app.route('/api/nfc/validate/<string:nfc_uuid>', methods=['GET'])
 def validate_nfc_card(nfc_uuid):
+    """
+    Com ?format=compact responde apenas a decisão em texto puro
+    ("1" autorizado, "0" negado, "E" erro), para leitores com pouca memória.
+    """
+    compact = request.args.get('format') == 'compact'
 
     try:
-        user = User.query.filter_by(nfc_card_uuid=nfc_uuid).first()
+        # Consulta o cache em memória (aquecido na inicialização)
+        entry = auth_cache.get(nfc_uuid)
         
-        if user:
-            # Cartão válido - gravar log de acesso
-            log = Log(
-                user_id=user.id,
+        # Os logs de acesso são gravados em lote pelo log_writer, então o
+        # id ainda não existe no momento da resposta (log_id = None).
+        # Leituras repetidas do mesmo cartão pelo mesmo leitor dentro da janela
+        # de debounce não geram log novo: somam-se ao repeat_count do primeiro
+        action = 'ACCESS_GRANTED' if entry else 'ACCESS_DENIED'
+        debounce_key = (request.remote_addr, nfc_uuid, action)
+        if not swipe_debouncer.hit(debounce_key):
+            # Logs negados não antecipam a carga do spool (seguem no próximo lote)
+            event = log_writer.submit(
+                wake=bool(entry),
+                user_id=entry.user_id if entry else None,
                 nfc_uuid=nfc_uuid,
-                user_exists=True,
-                action='ACCESS_GRANTED'
+                user_exists=bool(entry),
+                action=action
             )
-            db.session.add(log)
-            db.session.commit()
-            
+            swipe_debouncer.open(debounce_key, event)
+        
+        if entry:
+            # Cartão válido
+            if compact:
+                return Response('1', status=200, mimetype='text/plain')
             return jsonify({
                 'authorized': True,
-                'message': f'Acesso permitido para {user.name}',
-                'user': user.to_dict(),
-                'log_id': log.id
+                'message': f'Acesso permitido para {entry.name}',
+                'user': entry.user,
+                'log_id': None
             }), 200
         else:
-            # Cartão inválido - gravar log de acesso negado
-            log = Log(
-                user_id=None,
-                nfc_uuid=nfc_uuid,
-                user_exists=False,
-                action='ACCESS_DENIED'
-            )
-            db.session.add(log)
-            db.session.commit()
-            
+            # Cartão inválido
+            if compact:
+                return Response('0', status=404, mimetype='text/plain')
             return jsonify({
                 'authorized': False,
                 'message': 'Cartão NFC não cadastrado',
-                'log_id': log.id
+                'log_id': None
             }), 404
         
     except Exception as e:
         db.session.rollback()
+        if compact:
+            return Response('E', status=500, mimetype='text/plain')
+        return jsonify({'error': str(e)}), 500
+
+
+# Rota para VALIDAR em lote os cartões lidos por um leitor (ex.: buffer offline)
+@app.route('/api/nfc/validate/batch', methods=['POST'])
+def validate_nfc_batch():
+    """
+    Body: [ { "nfc_uuid": "...", "reader_ts": 1700000000 }, ... ]
+    (ou { "events": [...] }; aceita Content-Encoding: gzip)
+    Resolve todos os cartões com uma única consulta IN e grava os logs em
+    uma única transação. Retorna um resultado por evento, na mesma ordem.
+    """
+    try:
+        body = request.get_data()
+        if request.headers.get('Content-Encoding', '').lower() == 'gzip':
+            try:
+                body = gzip.decompress(body)
+            except (OSError, EOFError):
+                return jsonify({'error': 'Corpo gzip inválido'}), 400
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return jsonify({'error': 'JSON inválido'}), 400
+
+        events = data.get('events') if isinstance(data, dict) else data
+        if not isinstance(events, list):
+            return jsonify({'error': 'events deve ser uma lista'}), 400
+        if len(events) > app.config['NFC_BATCH_MAX_EVENTS']:
+            return jsonify({
+                'error': f'Máximo de {app.config["NFC_BATCH_MAX_EVENTS"]} eventos por requisição'
+            }), 413
+
+        uuids = {
+            event['nfc_uuid'] for event in events
+            if isinstance(event, dict) and isinstance(event.get('nfc_uuid'), str)
+        }
+        owners = {}
+        if uuids:
+            owners = dict(
+                db.session.query(User.nfc_card_uuid, User.id)
+                .filter(in_json_array(User.nfc_card_uuid, uuids))
+                .all()
+            )
+
+        results = []
+        rows = []
+        for event in events:
+            nfc_uuid = event.get('nfc_uuid') if isinstance(event, dict) else None
+            if not isinstance(nfc_uuid, str) or not nfc_uuid:
+                results.append({'nfc_uuid': nfc_uuid, 'error': 'nfc_uuid é obrigatório'})
+                continue
+            try:
+                timestamp = parse_reader_ts(event.get('reader_ts'))
+            except (ValueError, TypeError, OverflowError, OSError):
+                results.append({'nfc_uuid': nfc_uuid, 'error': 'reader_ts inválido'})
+                continue
+
+            user_id = owners.get(nfc_uuid)
+            rows.append({
+                'user_id': user_id,
+                'nfc_uuid': nfc_uuid,
+                'user_exists': user_id is not None,
+                'action': 'ACCESS_GRANTED' if user_id is not None else 'ACCESS_DENIED',
+                'timestamp': timestamp
+            })
+            results.append({'nfc_uuid': nfc_uuid, 'authorized': user_id is not None})
+
+        DailyAccessRollup.add(rows)
+        rows = DeniedCardStat.aggregate(
+            rows, app.config['DENIED_STATS_BUCKET_SECONDS'], app.config['DENIED_STATS_KEEP_FIRST']
+        )
+        if rows:
+            db.session.execute(insert(Log.__table__), rows)
+        db.session.commit()
+
+        return jsonify({
+            'results': results,
+            'total': len(results),
+            'authorized': sum(1 for r in results if r.get('authorized'))
+        }), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+# Rota para os leitores sincronizarem localmente a lista de cartões autorizados
+@app.route('/api/nfc/allowlist', methods=['GET'])
+def nfc_allowlist():
+    """
+    Sem parâmetros: lista completa { version, full: true, nfc_card_uuids }.
+    Com ?since=<version>: apenas o delta { version, full: false, added, removed }
+    desde a versão informada. O leitor guarda `version` para a próxima chamada.
+    """
+    try:
+        since = request.args.get('since', type=int)
+        current = db.session.query(db.func.max(AllowlistChange.version)).scalar() or 0
+
+        if since is None or since > current:
+            # Versão desconhecida (ex.: banco recriado) → lista completa.
+            # A versão é lida antes da lista: uma mudança concorrente pode vir
+            # duplicada no próximo delta, o que é inofensivo (ADD/REMOVE idempotentes)
+            uuids = [
+                card_uuid for (card_uuid,) in
+                db.session.query(User.nfc_card_uuid).filter(User.nfc_card_uuid.isnot(None))
+            ]
+            return jsonify({
+                'version': current,
+                'full': True,
+                'nfc_card_uuids': uuids
+            }), 200
+
+        changes = (
+            db.session.query(AllowlistChange.version, AllowlistChange.nfc_uuid, AllowlistChange.op)
+            .filter(AllowlistChange.version > since)
+            .order_by(AllowlistChange.version)
+            .all()
+        )
+
+        # Estado final de cada cartão no intervalo (a última operação prevalece)
+        final_ops = {}
+        version = since
+        for change_version, card_uuid, op in changes:
+            final_ops[card_uuid] = op
+            version = change_version
+
+        return jsonify({
+            'version': version,
+            'full': False,
+            'added': [u for u, op in final_ops.items() if op == 'ADD'],
+            'removed': [u for u, op in final_ops.items() if op == 'REMOVE']
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# Rota com o Bloom filter dos cartões autorizados (leitores com pouca memória)
+@app.route('/api/nfc/allowlist/bloom', methods=['GET'])
+def nfc_allowlist_bloom():
+    """
+    Query: ?fp=<taxa de falsos positivos> (padrão NFC_BLOOM_FP_RATE)
+    Retorna application/octet-stream: cabeçalho de 16 bytes little-endian
+    (magic "BLM1", bits, hashes, versão da allowlist) seguido do mapa de bits.
+    Suporta ETag / If-None-Match. O leitor rejeita localmente os cartões
+    ausentes do filtro e só chama /api/nfc/validate para os prováveis.
+    """
+    try:
+        fp_rate = request.args.get('fp', app.config['NFC_BLOOM_FP_RATE'], type=float)
+        if not 0.0001 <= fp_rate <= 0.5:
+            return jsonify({'error': 'fp deve estar entre 0.0001 e 0.5'}), 400
+
+        etag, payload = allowlist_blooms.get(round(fp_rate, 4)).snapshot()
+        response = Response(payload, status=200, mimetype='application/octet-stream')
+        response.set_etag(etag)
+        return response.make_conditional(request)
+
+    except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
@@ -411,9 +1173,7 @@ def nfc_sync():
         if not session:
             # Nenhuma sessão ativa esperando pareamento
             # Registrar log de tentativa não autorizada
-            log = Log(user_id=None, nfc_uuid=nfc_uuid, user_exists=False, action='SYNC_NO_SESSION')
-            db.session.add(log)
-            db.session.commit()
+            log_writer.submit(user_id=None, nfc_uuid=nfc_uuid, user_exists=False, action='SYNC_NO_SESSION')
             return jsonify({'linked': False, 'message': 'Nenhuma sessão de pareamento ativa'}), 404
 
         # Vincular UUID ao usuário
@@ -421,11 +1181,10 @@ def nfc_sync():
         if not user:
             return jsonify({'error': 'Usuário da sessão de pareamento não encontrado'}), 404
 
-        # Evitar duplicidade
-        existing = User.query.filter_by(nfc_card_uuid=nfc_uuid).first()
-        if existing:
-            return jsonify({'error': 'UUID já vinculado a outro usuário'}), 409
-
+        # UUID já vinculado a outro usuário é recusado pela restrição UNIQUE.
+        # O usuário pode ter recebido um cartão (link/edição) com a sessão aberta:
+        # o cartão substituído também sai do cache e da allowlist
+        old_nfc_uuid = user.nfc_card_uuid
         user.nfc_card_uuid = nfc_uuid
         session.vinculado = True
 
@@ -433,10 +1192,19 @@ def nfc_sync():
         log = Log(user_id=user.id, nfc_uuid=nfc_uuid, user_exists=True, action='LINK')
 
         db.session.add(log)
+        db.session.flush()
+        DailyAccessRollup.add([log])
+        AllowlistChange.record(old_nfc_uuid, nfc_uuid)
         db.session.commit()
+        auth_cache.invalidate(old_nfc_uuid, nfc_uuid)
 
         return jsonify({'linked': True, 'user': user.to_dict(), 'pair_token': session.pair_token}), 200
 
+    except IntegrityError as e:
+        db.session.rollback()
+        return unique_violation_response(e, {
+            **USER_UNIQUE_ERRORS, 'users.nfc_card_uuid': ('UUID já vinculado a outro usuário', 409)
+        })
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -488,14 +1256,16 @@ def unlink_nfc_from_user():
         if not user.nfc_card_uuid:
             return jsonify({'error': 'Usuário não possui cartão NFC vinculado'}), 400
 
+        # Desvincular e gravar o log de UNLINK na mesma transação
         nfc_uuid = user.nfc_card_uuid
         user.nfc_card_uuid = None
-        db.session.commit()
-
-        # Gravar log de UNLINK
+        AllowlistChange.record(nfc_uuid, None)
         log = Log(user_id=user.id, nfc_uuid=nfc_uuid, user_exists=True, action='UNLINK')
         db.session.add(log)
+        db.session.flush()
+        DailyAccessRollup.add([log])
         db.session.commit()
+        auth_cache.invalidate(nfc_uuid)
 
         return jsonify({
             'message': 'Cartão NFC desvinculado com sucesso',
@@ -535,18 +1305,470 @@ def unlink_nfc_from_user():
 #     except Exception as e:
 #         return jsonify({'error': str(e)}), 500
 
-# Rota para listar todos os logs
+# Rota para listar os logs (paginada por cursor, do mais recente ao mais antigo)
 @app.route('/api/logs', methods=['GET'])
 def list_logs():
+    """
+    Query: ?limit=<n> (padrão LOGS_PAGE_SIZE) e ?cursor=<next_cursor da página anterior>
+    Percorre o índice (timestamp, id) a partir do cursor, então o custo de cada
+    página não depende do tamanho da tabela. `next_cursor` é null na última página.
+
+    Filtros (combináveis, repetidos junto com o cursor): ?user_id=, ?nfc_uuid=,
+    ?action= (repetível ou separado por vírgula), ?from= e ?to= (ISO-8601).
+    Cada um tem um índice terminado em timestamp, na ordem da listagem; com
+    várias ações é feita uma consulta por ação e os resultados são intercalados.
+
+    Com ?after_id=<id> funciona como "tail" para dashboards que fazem polling:
+    devolve só os logs com id maior, em ordem crescente de id, e 304 sem corpo
+    quando não há nada novo. O cliente repete a chamada com `last_id`.
+    """
     try:
-        logs = Log.query.order_by(Log.timestamp.desc()).all()
+        from datetime import datetime
+        limit = request.args.get('limit', app.config['LOGS_PAGE_SIZE'], type=int)
+        limit = min(max(limit, 1), app.config['LOGS_MAX_PAGE_SIZE'])
+        try:
+            criteria, actions = parse_log_filters(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        after_id = request.args.get('after_id', type=int)
+        if after_id is not None:
+            # Faixa sobre a chave primária (rowid): custo proporcional aos logs novos
+            if actions:
+                criteria.append(Log.action.in_(actions))
+            logs = (
+                Log.query.filter(Log.id > after_id, *criteria)
+                .order_by(Log.id)
+                .limit(limit + 1)
+                .all()
+            )
+            if not logs:
+                return Response(status=304)
+
+            has_more = len(logs) > limit
+            logs = logs[:limit]
+            return jsonify({
+                'logs': [log.to_dict() for log in logs],
+                'total': len(logs),
+                'last_id': logs[-1].id,
+                'has_more': has_more
+            }), 200
+
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                cursor_ts, cursor_id = decode_cursor(cursor)
+                cursor_ts = datetime.fromisoformat(cursor_ts)
+            except (ValueError, TypeError):
+                return jsonify({'error': 'cursor inválido'}), 400
+            criteria.append(db.tuple_(Log.timestamp, Log.id) < (cursor_ts, cursor_id))
+
+        # Busca um item a mais para saber se existe próxima página
+        def page(*extra):
+            return (
+                Log.query.filter(*criteria, *extra)
+                .order_by(Log.timestamp.desc(), Log.id.desc())
+                .limit(limit + 1)
+                .all()
+            )
+
+        if len(actions) > 1:
+            logs = [log for action in actions for log in page(Log.action == action)]
+            logs.sort(key=lambda log: (log.timestamp, log.id), reverse=True)
+            logs = logs[:limit + 1]
+        else:
+            logs = page(*[Log.action == action for action in actions])
+        next_cursor = None
+        if len(logs) > limit:
+            logs = logs[:limit]
+            next_cursor = encode_cursor(logs[-1].timestamp.isoformat(), logs[-1].id)
+
         return jsonify({
             'logs': [log.to_dict() for log in logs],
-            'total': len(logs)
+            'total': len(logs),
+            'next_cursor': next_cursor
         }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Rota para exportar os logs (CSV ou NDJSON) em streaming
+@app.route('/api/logs/export', methods=['GET'])
+def export_logs():
+    """
+    Query: ?format=csv|ndjson (padrão csv) e os mesmos filtros de /api/logs
+    (user_id, nfc_uuid, action, from, to), em ordem crescente de (timestamp, id).
+    As linhas são lidas em lotes de LOGS_EXPORT_BATCH_SIZE a partir do último
+    (timestamp, id) lido, pelo mesmo índice do filtro (como em /api/logs), e
+    escritas na resposta conforme chegam, então nem a memória nem o custo de
+    cada lote crescem com o tamanho da exportação. Cada lote é uma leitura curta, para não bloquear a
+    gravação de logs durante exportações longas. Com `Accept-Encoding: gzip`
+    a saída é comprimida enquanto é gerada.
+    """
+    try:
+        import zlib
+        export_format = request.args.get('format', 'csv')
+        if export_format not in ('csv', 'ndjson'):
+            return jsonify({'error': 'format deve ser csv ou ndjson'}), 400
+        try:
+            criteria, actions = parse_log_filters(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        table = Log.__table__
+        engine = db.engine
+        batch_size = app.config['LOGS_EXPORT_BATCH_SIZE']
+        columns = [column.name for column in table.c]
+        compress = 'gzip' in request.headers.get('Accept-Encoding', '').lower()
+
+        def rows():
+            after = []
+            while True:
+                # Uma consulta por ação, como em /api/logs, para que cada uma
+                # percorra o índice (action, timestamp) em ordem
+                with engine.connect() as conn:
+                    batch = [
+                        row
+                        for extra in ([[table.c.action == action] for action in actions] or [[]])
+                        for row in conn.execute(
+                            db.select(table).where(*criteria, *after, *extra)
+                            .order_by(table.c.timestamp, table.c.id).limit(batch_size)
+                        )
+                    ]
+                if not batch:
+                    return
+                if len(actions) > 1:
+                    batch.sort(key=lambda row: (row.timestamp, row.id))
+                    batch = batch[:batch_size]
+                last = batch[-1]
+                after = [db.tuple_(table.c.timestamp, table.c.id) > (last.timestamp, last.id)]
+                yield [Log(**row._mapping).to_dict() for row in batch]
+
+        def generate():
+            if export_format == 'csv':
+                buffer = io.StringIO()
+                writer = csv.DictWriter(buffer, fieldnames=columns)
+                writer.writeheader()
+                for batch in rows():
+                    writer.writerows(batch)
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+                if buffer.tell():
+                    yield buffer.getvalue()
+            else:
+                for batch in rows():
+                    yield ''.join(json.dumps(log, ensure_ascii=False) + '\n' for log in batch)
+
+        def gzipped(chunks):
+            compressor = zlib.compressobj(wbits=31)  # formato gzip
+            for chunk in chunks:
+                data = compressor.compress(chunk.encode('utf-8'))
+                if data:
+                    yield data
+            yield compressor.flush()
+
+        body = gzipped(generate()) if compress else (chunk.encode('utf-8') for chunk in generate())
+        mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+        headers = {
+            'Content-Disposition': f'attachment; filename=logs.{export_format}',
+            'Vary': 'Accept-Encoding'
+        }
+        if compress:
+            headers['Content-Encoding'] = 'gzip'
+        return Response(body, mimetype=mimetype, headers=headers)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def attempt_counts(key_fn, date_from, date_to):
+    """Tentativas de acesso em [date_from, date_to) por (chave, ação, user_exists)
+
+    `key_fn(coluna)` gera a chave de agrupamento a partir do timestamp (ou None
+    para não agrupar por tempo). Soma o repeat_count dos logs e os contadores
+    de denied_card_stats; as tentativas negadas de uma janela contam no início
+    dela. Logs negados anteriores ao primeiro contador (bancos antigos) vêm de `logs`.
+    """
+    from models.denied_card_stat import DENIED_ACTIONS
+
+    def grouped(timestamp, *columns, count, where=(), before=None):
+        keys = ([key_fn(timestamp)] if key_fn else []) + list(columns)
+        query = db.session.query(*keys, db.func.sum(count)).filter(*where)
+        if date_from:
+            query = query.filter(timestamp >= date_from)
+        for bound in (date_to, before):
+            if bound:
+                query = query.filter(timestamp < bound)
+        # GROUP BY em ordem inversa: começando por action, o SQLite prefere
+        # varrer o índice (action, timestamp) inteiro a usar a faixa de timestamp
+        return [tuple(row) for row in query.group_by(*reversed(keys))]
+
+    # Consultas separadas (sem OR): cada uma mantém a faixa de timestamp no índice
+    cutoff = db.session.query(db.func.min(DeniedCardStat.bucket_start)).scalar()
+    if cutoff is None:
+        rows = grouped(Log.timestamp, Log.action, Log.user_exists, count=Log.repeat_count)
+    else:
+        rows = grouped(
+            Log.timestamp, Log.action, Log.user_exists, count=Log.repeat_count,
+            where=[Log.action.notin_(DENIED_ACTIONS)]
+        )
+        if not date_from or date_from < cutoff:
+            rows += grouped(
+                Log.timestamp, Log.action, Log.user_exists, count=Log.repeat_count,
+                where=[Log.action.in_(DENIED_ACTIONS)], before=cutoff
+            )
+
+    for *key, action, count in grouped(DeniedCardStat.bucket_start, DeniedCardStat.action, count=DeniedCardStat.count):
+        rows.append((*key, action, False, count))
+
+    if not key_fn:
+        rows = [(None, *row) for row in rows]
+    return rows
+
+# Rota com as estatísticas do sistema, agregadas no banco
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """
+    Query: ?from=<ISO-8601>&to=<ISO-8601>&bucket=day|hour
+    Sem from/to os totais de logs consideram todo o histórico e a série
+    cobre os últimos 7 dias. A série traz um item por bucket, inclusive vazios.
+    Os números são tentativas de acesso: incluem leituras repetidas e negadas
+    agregadas em denied_card_stats. Totais em dias inteiros e a série por dia
+    são lidos de daily_access_rollup.
+    """
+    try:
+        from datetime import datetime, timedelta
+        bucket = request.args.get('bucket', 'day')
+        if bucket not in ('day', 'hour'):
+            return jsonify({'error': 'bucket deve ser day ou hour'}), 400
+        try:
+            date_from = parse_date_param(request.args['from'], 'from') if 'from' in request.args else None
+            date_to = parse_date_param(request.args['to'], 'to') if 'to' in request.args else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        step = timedelta(days=1) if bucket == 'day' else timedelta(hours=1)
+        now = get_brt_now().replace(tzinfo=None)
+        series_to = date_to or now
+        series_from = date_from or (series_to - timedelta(days=6)).replace(hour=0, minute=0, second=0, microsecond=0)
+        if (series_to - series_from) / step > 1000:
+            return jsonify({'error': 'Intervalo grande demais para o bucket escolhido'}), 400
+
+        def compute():
+            with_nfc = db.func.count(db.case((db.func.coalesce(User.nfc_card_uuid, '') != '', 1)))
+            total_users, users_with_nfc = db.session.query(db.func.count(User.id), with_nfc).one()
+
+            # Intervalos em dias inteiros saem do rollup diário; os demais, dos logs
+            # e de denied_card_stats
+            def whole_day(value):
+                return value is None or value == datetime.combine(value.date(), datetime.min.time())
+
+            rollup = DailyAccessRollup
+            if whole_day(date_from) and whole_day(date_to):
+                totals = db.session.query(rollup.action, rollup.user_id.isnot(None), db.func.sum(rollup.count))
+                if date_from:
+                    totals = totals.filter(rollup.day >= date_from.date())
+                if date_to:
+                    totals = totals.filter(rollup.day < date_to.date())
+                totals = totals.group_by(rollup.action, rollup.user_id.isnot(None))
+            else:
+                totals = [row[1:] for row in attempt_counts(None, date_from, date_to)]
+            by_action = {}
+            authorized = denied = 0
+            for action, user_exists, count in totals:
+                by_action[action] = by_action.get(action, 0) + count
+                if user_exists:
+                    authorized += count
+                else:
+                    denied += count
+
+            fmt = '%Y-%m-%d' if bucket == 'day' else '%Y-%m-%dT%H:00'
+            if bucket == 'day':
+                rows = (
+                    db.session.query(rollup.day, rollup.user_id.isnot(None), db.func.sum(rollup.count))
+                    .filter(rollup.day >= series_from.date(), rollup.day <= series_to.date())
+                    .group_by(rollup.day, rollup.user_id.isnot(None))
+                )
+            else:
+                rows = [
+                    (key, user_exists, count)
+                    for key, _, user_exists, count in attempt_counts(
+                        lambda column: db.func.strftime(fmt, column), series_from, series_to + step
+                    )
+                ]
+            counts = {}
+            for key, user_exists, count in rows:
+                if bucket == 'day':
+                    key = key.strftime(fmt)
+                entry = counts.setdefault(key, {'total': 0, 'authorized': 0, 'denied': 0})
+                entry['total'] += count
+                entry['authorized' if user_exists else 'denied'] += count
+
+            series = []
+            current = series_from.replace(minute=0, second=0, microsecond=0)
+            if bucket == 'day':
+                current = current.replace(hour=0)
+            while current <= series_to:
+                key = current.strftime(fmt)
+                series.append({'bucket': key, **counts.get(key, {'total': 0, 'authorized': 0, 'denied': 0})})
+                current += step
+
+            return {
+                'users': {
+                    'total': total_users,
+                    'with_nfc': users_with_nfc,
+                    'without_nfc': total_users - users_with_nfc
+                },
+                'logs': {
+                    'total': authorized + denied,
+                    'authorized': authorized,
+                    'denied': denied,
+                    'by_action': by_action
+                },
+                'bucket': bucket,
+                'series': series
+            }
+
+        cache_key = (date_from, date_to, bucket, None if date_to else series_to.strftime('%Y-%m-%dT%H'))
+        return jsonify(stats_cache.get_or_compute(cache_key, compute)), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Rota com o histograma de acessos por ação, em N buckets
+@app.route('/api/stats/histogram', methods=['GET'])
+def get_stats_histogram():
+    """
+    Query: ?from=<ISO-8601>&to=<ISO-8601>&buckets=N
+    Devolve exatamente N buckets de mesma largura cobrindo [from, to). A
+    granularidade (minute, hour ou day) é escolhida pela largura do bucket,
+    e `from` é arredondado para baixo nessa unidade. Buckets de dias inteiros
+    vêm de daily_access_rollup; os menores, de uma varredura por faixa de
+    timestamp nos logs e em denied_card_stats. Conta tentativas de acesso,
+    como /api/stats. Sem from/to cobre os últimos 7 dias (até o fim de hoje).
+    """
+    try:
+        import calendar
+        from datetime import datetime, timedelta
+        try:
+            buckets = int(request.args.get('buckets', 7))
+        except ValueError:
+            return jsonify({'error': 'buckets deve ser um número inteiro'}), 400
+        max_buckets = app.config['STATS_HISTOGRAM_MAX_BUCKETS']
+        if not 1 <= buckets <= max_buckets:
+            return jsonify({'error': f'buckets deve estar entre 1 e {max_buckets}'}), 400
+        try:
+            date_from = parse_date_param(request.args['from'], 'from') if 'from' in request.args else None
+            date_to = parse_date_param(request.args['to'], 'to') if 'to' in request.args else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        if not date_to:
+            date_to = datetime.combine(get_brt_now().date() + timedelta(days=1), datetime.min.time())
+        date_from = date_from or date_to - timedelta(days=7)
+        if date_from >= date_to:
+            return jsonify({'error': 'from deve ser anterior a to'}), 400
+
+        # Largura do bucket: múltiplo inteiro da maior unidade que cabe nela
+        width = (date_to - date_from).total_seconds() / buckets
+        for granularity, unit in (('day', 86400), ('hour', 3600), ('minute', 60)):
+            if width >= unit or granularity == 'minute':
+                break
+        if granularity == 'day':
+            start = datetime.combine(date_from.date(), datetime.min.time())
+        else:
+            start = date_from.replace(second=0, microsecond=0)
+            if granularity == 'hour':
+                start = start.replace(minute=0)
+        # Com from arredondado para baixo os N buckets ainda precisam alcançar to
+        bucket_seconds = unit * -(-(date_to - start).total_seconds() // (unit * buckets))
+        bucket_seconds = int(bucket_seconds)
+        end = start + timedelta(seconds=bucket_seconds * buckets)
+
+        def compute():
+            counts = [{} for _ in range(buckets)]
+            if granularity == 'day':
+                rollup = DailyAccessRollup
+                rows = (
+                    db.session.query(rollup.day, rollup.action, db.func.sum(rollup.count))
+                    .filter(rollup.day >= start.date(), rollup.day < end.date())
+                    .group_by(rollup.day, rollup.action)
+                )
+                for day, action, count in rows:
+                    index = (day - start.date()).days * 86400 // bucket_seconds
+                    counts[index][action] = counts[index].get(action, 0) + count
+            else:
+                # strftime('%s') lê o timestamp local como se fosse UTC; o início
+                # é convertido do mesmo jeito para que as diferenças batam. Os
+                # microssegundos são cortados antes: o SQLite arredonda para
+                # milissegundos, e 23:59:59.9995 cairia no bucket seguinte (fora da faixa)
+                def index_col(column):
+                    return db.cast(
+                        (db.cast(db.func.strftime('%s', db.func.substr(column, 1, 19)), db.Integer)
+                         - calendar.timegm(start.timetuple())) / bucket_seconds,
+                        db.Integer
+                    )
+
+                for index, action, _, count in attempt_counts(index_col, start, end):
+                    counts[index][action] = counts[index].get(action, 0) + count
+
+            return {
+                'from': start.isoformat(),
+                'to': end.isoformat(),
+                'granularity': granularity,
+                'bucket_seconds': bucket_seconds,
+                'buckets': [
+                    {
+                        'start': (start + timedelta(seconds=bucket_seconds * i)).isoformat(),
+                        'total': sum(by_action.values()),
+                        'by_action': by_action
+                    }
+                    for i, by_action in enumerate(counts)
+                ]
+            }
+
+        cache_key = ('histogram', start, end, buckets)
+        return jsonify(stats_cache.get_or_compute(cache_key, compute)), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Stream Server-Sent Events com os novos logs e mudanças de pareamento
+@app.route('/api/events', methods=['GET'])
+def event_stream():
+    """
+    Query: ?types=log,pairing (padrão: todos) e ?pair_token=<token> (apenas
+    eventos de pareamento desse token). Envia o header Last-Event-ID (ou
+    ?last_event_id=) para retomar de onde parou; o evento `reset` indica que
+    não foi possível retomar e o cliente deve recarregar o estado. Os eventos
+    são lidos do banco (event_broker.tail), então incluem o que outros
+    processos gravaram.
+    """
+    types = [t for t in request.args.get('types', '').split(',') if t]
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    stream = event_broker.stream(
+        types=types,
+        pair_token=request.args.get('pair_token'),
+        last_event_id=last_event_id
+    )
+    return Response(stream, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+# Rota para listar os contadores de tentativas negadas (por cartão, ação e janela)
+@app.route('/api/logs/denied', methods=['GET'])
+def list_denied_stats():
+    try:
+        limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+        stats = DeniedCardStat.query.order_by(DeniedCardStat.last_seen.desc()).limit(limit).all()
+        return jsonify({
+            'stats': [stat.to_dict() for stat in stats],
+            'total': len(stats)
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 if __name__ == '__main__':
     app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,249 @@
+"""Verificação automática dos planos de consulta das rotas
+
+Cria um banco sintético grande em um diretório temporário, chama cada rota
+do app.py pelo test client, captura os SQL executados (evento
+before_cursor_execute, inclusive os da carga do spool) e roda EXPLAIN QUERY
+PLAN em cada um. Sai com código 1 se alguma consulta acessar uma tabela sem
+índice nem chave primária, ler um índice inteiro (exceto as varreduras de
+query_plans.ALLOWED_SCANS), ou se alguma rota falhar. Todas as tabelas são
+verificadas, inclusive daily_access_rollup, allowlist_changes e denied_card_stats.
+
+Uso: python check_query_plans.py [--users 10000] [--logs 200000] [--sessions 2000]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+from datetime import timedelta
+
+ACTIONS = ('ACCESS_GRANTED', 'ACCESS_DENIED', 'LINK', 'UNLINK', 'SYNC_NO_SESSION')
+
+
+def seed(db, users, logs, sessions):
+    """Preenche o banco com dados sintéticos via inserts em lote"""
+    from sqlalchemy import insert
+    from models.user import User, get_brt_now
+    from models.log import Log
+    from models.pairing import PairingSession
+    from models.allowlist_change import AllowlistChange
+    from models.denied_card_stat import DeniedCardStat
+    from models.daily_access_rollup import DailyAccessRollup
+
+    rng = random.Random(5670)
+    now = get_brt_now().replace(tzinfo=None)
+    cards = {i: f'SEED:{i:08X}' for i in range(1, users + 1) if i % 2 == 0}
+
+    db.session.execute(insert(User.__table__), [
+        {
+            'id': i,
+            'name': f'Usuário {i}',
+            'cpf': f'{i:011d}',
+            'email': f'usuario{i}@example.com',
+            'phone': '48999999999',
+            'nfc_card_uuid': cards.get(i),
+            'created_at': now - timedelta(days=i % 365),
+            'updated_at': now
+        }
+        for i in range(1, users + 1)
+    ])
+    db.session.execute(insert(AllowlistChange.__table__), [
+        {'nfc_uuid': card, 'op': 'ADD', 'created_at': now} for card in cards.values()
+    ])
+    db.session.execute(insert(PairingSession.__table__), [
+        {
+            'pair_token': f'seed-{i}',
+            'user_id': rng.randint(1, users),
+            'created_at': now - timedelta(minutes=i),
+            'expires_at': now - timedelta(minutes=i - 1),
+            'vinculado': i % 3 == 0
+        }
+        for i in range(1, sessions + 1)
+    ])
+    db.session.commit()
+
+    # Logs em lotes com commit: a carga do spool (outra thread) não fica bloqueada
+    rows = []
+    for i in range(logs):
+        user_id = rng.randint(1, users)
+        action = rng.choice(ACTIONS)
+        exists = action not in ('ACCESS_DENIED', 'SYNC_NO_SESSION')
+        rows.append({
+            'user_id': user_id if exists else None,
+            'nfc_uuid': cards.get(user_id, f'UNKNOWN:{i % 5000:04X}'),
+            'user_exists': exists,
+            'action': action,
+            'timestamp': now - timedelta(seconds=rng.randint(0, 365 * 86400))
+        })
+        if len(rows) == 20000:
+            db.session.execute(insert(Log.__table__), rows)
+            db.session.commit()
+            rows = []
+    if rows:
+        db.session.execute(insert(Log.__table__), rows)
+    db.session.execute(insert(DeniedCardStat.__table__), [
+        {
+            'nfc_uuid': f'UNKNOWN:{i:04X}',
+            'action': 'ACCESS_DENIED',
+            'bucket_start': now - timedelta(hours=i),
+            'count': 10,
+            'first_seen': now - timedelta(hours=i),
+            'last_seen': now - timedelta(hours=i)
+        }
+        for i in range(1000)
+    ])
+    DailyAccessRollup.rebuild()
+    db.session.commit()
+
+
+def routes(users):
+    """Requisições que exercitam todas as rotas: (rota, método, caminho, corpo)"""
+    free_cpf = f'{1:011d}'          # usuário ímpar: sem cartão
+    carded_cpf = f'{2:011d}'
+    card = 'SEED:00000002'
+    new_cpf = f'{users + 1:011d}'
+    since = max(users // 2 - 10, 0)
+    return [
+        ('GET /', 'GET', '/', None),
+        ('POST /api/users', 'POST', '/api/users',
+         {'name': 'Novo', 'cpf': new_cpf, 'email': 'novo@example.com', 'phone': '48988888888'}),
+        ('POST /api/users/bulk', 'POST', '/api/users/bulk', [
+            {'name': f'Lote {i}', 'cpf': f'{users + 100 + i:011d}', 'email': f'lote{i}@example.com', 'phone': '48977777777'}
+            for i in range(50)
+        ] + [{'name': 'Repetido', 'cpf': free_cpf, 'email': 'repetido@example.com', 'phone': '48977777777'}]),
+        ('GET /api/users', 'GET', '/api/users?limit=50', None),
+        ('GET /api/users', 'GET', '/api/users?limit=50&sort=name&order=desc&has_nfc=true', None),
+        ('GET /api/users', 'GET', '/api/users?limit=50&sort=name&order=desc&has_nfc=true&cursor={next_cursor}', None),
+        ('GET /api/users', 'GET', '/api/users?limit=50&sort=updated_at&has_nfc=false', None),
+        ('GET /api/users/search', 'GET', '/api/users/search?q=usu 12', None),
+        ('GET /api/users/cpf/<cpf>', 'GET', f'/api/users/cpf/{carded_cpf}', None),
+        ('PUT /api/users/cpf/<cpf>', 'PUT', f'/api/users/cpf/{new_cpf}',
+         {'name': 'Novo Nome', 'email': 'novo2@example.com', 'nfc_card_uuid': 'NEW:0001'}),
+        ('PUT /api/nfc/link', 'PUT', '/api/nfc/link', {'cpf': free_cpf, 'nfc_card_uuid': 'NEW:0002'}),
+        ('POST /api/nfc/link/bulk', 'POST', '/api/nfc/link/bulk', [
+            {'cpf': f'{5:011d}', 'nfc_card_uuid': 'NEW:0005'},
+            {'cpf': f'{7:011d}', 'nfc_card_uuid': card},
+            {'cpf': carded_cpf, 'nfc_card_uuid': 'NEW:0006'},
+        ]),
+        ('GET /api/nfc/validate/<nfc_uuid>', 'GET', f'/api/nfc/validate/{card}', None),
+        ('GET /api/nfc/validate/<nfc_uuid>', 'GET', '/api/nfc/validate/NOT:FOUND?format=compact', None),
+        ('POST /api/nfc/validate/batch', 'POST', '/api/nfc/validate/batch',
+         {'events': [{'nfc_uuid': card}, {'nfc_uuid': 'NEW:0002'}, {'nfc_uuid': 'NOT:FOUND'}]}),
+        ('GET /api/nfc/allowlist', 'GET', '/api/nfc/allowlist', None),
+        ('GET /api/nfc/allowlist', 'GET', f'/api/nfc/allowlist?since={since}', None),
+        ('GET /api/nfc/allowlist/bloom', 'GET', '/api/nfc/allowlist/bloom', None),
+        ('POST /api/nfc/sync', 'POST', '/api/nfc/sync', {'nfc_card_uuid': 'NO:SESSION'}),
+        ('POST /api/nfc/pair_start', 'POST', '/api/nfc/pair_start', {'cpf': f'{3:011d}'}),
+        ('GET /api/nfc/pair_status/<pair_token>', 'GET', '/api/nfc/pair_status/{pair_token}', None),
+        ('POST /api/nfc/sync', 'POST', '/api/nfc/sync', {'nfc_card_uuid': 'NEW:0003'}),
+        ('PUT /api/nfc/unlink', 'PUT', '/api/nfc/unlink', {'cpf': carded_cpf}),
+        ('GET /api/logs', 'GET', '/api/logs?limit=50', None),
+        ('GET /api/logs', 'GET', '/api/logs?limit=50&cursor={next_cursor}', None),
+        ('GET /api/logs', 'GET', '/api/logs?after_id=100', None),
+        ('GET /api/logs', 'GET', f'/api/logs?user_id=5&from={{hour_ago}}', None),
+        ('GET /api/logs', 'GET', f'/api/logs?nfc_uuid={card}&action=ACCESS_GRANTED', None),
+        ('GET /api/logs', 'GET', '/api/logs?action=ACCESS_DENIED,SYNC_NO_SESSION&from=2024-01-01&to={hour_ago}', None),
+        ('GET /api/logs', 'GET', '/api/logs?action=LINK&cursor={next_cursor}', None),
+        ('GET /api/logs/export', 'GET', '/api/logs/export?format=ndjson&action=ACCESS_DENIED&from={hour_ago}', None),
+        ('GET /api/logs/export', 'GET', '/api/logs/export?user_id=5', None),
+        ('GET /api/logs/export', 'GET', '/api/logs/export?action=LINK,UNLINK&to={hour_ago}', None),
+        ('GET /api/stats', 'GET', '/api/stats', None),
+        ('GET /api/stats', 'GET', '/api/stats?from={hour_ago}&bucket=hour', None),
+        ('GET /api/stats', 'GET', '/api/stats?from=2024-01-01&to={today}', None),
+        ('GET /api/stats/histogram', 'GET', '/api/stats/histogram?buckets=7', None),
+        ('GET /api/stats/histogram', 'GET', '/api/stats/histogram?buckets=12', None),
+        ('GET /api/stats/histogram', 'GET', '/api/stats/histogram?from={hour_ago}&buckets=60', None),
+        ('GET /api/logs/denied', 'GET', '/api/logs/denied', None),
+        ('DELETE /api/users/cpf/<cpf>', 'DELETE', f'/api/users/cpf/{new_cpf}', None),
+        # GET /api/events (SSE) não consulta o banco por cliente: o tail do
+        # event_broker roda na thread do log-writer (capturado como "carga do spool")
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--logs', type=int, default=200000)
+    parser.add_argument('--sessions', type=int, default=2000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='query-plans-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'database.sqlite')
+    os.environ['LOG_SPOOL_DIR'] = os.path.join(workdir, 'spool')
+    try:
+        return check(args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def check(args, workdir):
+    # Importado só aqui: o app lê DATABASE_URL/LOG_SPOOL_DIR ao ser carregado
+    from sqlalchemy import event
+    from app import app, db
+    from models.user import get_brt_now
+    from query_plans import explain, plan_problems, table_names
+    from services.log_writer import log_writer
+
+    with app.app_context():
+        seed(db, args.users, args.logs, args.sessions)
+        engine = db.engine
+
+    current = [None]
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE', 'INSERT')):
+            # Em executemany basta o primeiro conjunto de parâmetros
+            if parameters and isinstance(parameters[0], (tuple, list)):
+                parameters = parameters[0]
+            captured.append((current[0] or 'carga do spool', statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', capture)
+    # Lotes pequenos: a exportação faz várias leituras, não só a primeira
+    app.config['LOGS_EXPORT_BATCH_SIZE'] = 100
+    client = app.test_client()
+    values = {
+        'hour_ago': (get_brt_now() - timedelta(hours=1)).replace(tzinfo=None).isoformat(),
+        'today': get_brt_now().date().isoformat()
+    }
+    failures = []
+    for route, method, path, body in routes(args.users):
+        current[0] = route
+        response = client.open(path.format(**values), method=method, json=body)
+        response.get_data()  # consome respostas em streaming (exportação)
+        if response.status_code >= 500:
+            failures.append(f'{route}: HTTP {response.status_code} {response.get_data(as_text=True)}')
+        data = response.get_json(silent=True) or {}
+        for key in ('pair_token', 'next_cursor'):
+            if data.get(key):
+                values[key] = data[key]
+        log_writer.flush(timeout=10)
+    current[0] = None
+    log_writer.stop()
+    event.remove(engine, 'before_cursor_execute', capture)
+
+    checked = set()
+    with engine.connect() as connection:
+        tables = table_names(connection)
+        for route, statement, parameters in captured:
+            if (route, statement) in checked:
+                continue
+            checked.add((route, statement))
+            plan = explain(connection, statement, parameters)
+            problems = plan_problems(plan, statement, tables)
+            if problems:
+                failures.append(
+                    f'{route}: {"; ".join(problems)}\n    {statement}\n    '
+                    + '\n    '.join(plan)
+                )
+
+    print(f'{len(checked)} consultas verificadas em {len(routes(args.users))} requisições '
+          f'({args.users} usuários, {args.logs} logs, {args.sessions} sessões)')
+    for failure in failures:
+        print(f'FALHA {failure}')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,66 @@
+from sqlalchemy import inspect, text
+
+# Colunas adicionadas depois da criação original das tabelas:
+# (tabela, coluna, definição SQL usada no ALTER TABLE)
+ADDED_COLUMNS = [
+    ('logs', 'repeat_count', 'INTEGER NOT NULL DEFAULT 1'),
+]
+
+# Índices substituídos por outros do modelo (removidos de bancos existentes)
+DROPPED_INDEXES = [
+    'ix_logs_timestamp_action_user_exists',  # substituído por ix_logs_timestamp_counts
+]
+
+# Telefone só com dígitos no índice de busca, para casar prefixos como "4899"
+PHONE_DIGITS = "replace(replace(replace(replace(replace(replace({}, ' ', ''), '(', ''), ')', ''), '-', ''), '+', ''), '.', '')"
+
+# Índice FTS5 da busca de usuários (rowid = users.id), mantido por triggers
+USERS_FTS = [
+    """CREATE VIRTUAL TABLE users_fts USING fts5(
+        name, email, phone, cpf,
+        prefix='2 3', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER users_fts_insert AFTER INSERT ON users BEGIN
+        INSERT INTO users_fts(rowid, name, email, phone, cpf)
+        VALUES (new.id, new.name, new.email, {PHONE_DIGITS.format('new.phone')}, new.cpf);
+    END""",
+    """CREATE TRIGGER users_fts_delete AFTER DELETE ON users BEGIN
+        DELETE FROM users_fts WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER users_fts_update AFTER UPDATE OF name, email, phone, cpf ON users BEGIN
+        UPDATE users_fts SET name = new.name, email = new.email,
+            phone = {PHONE_DIGITS.format('new.phone')}, cpf = new.cpf
+        WHERE rowid = new.id;
+    END""",
+    f"""INSERT INTO users_fts(rowid, name, email, phone, cpf)
+        SELECT id, name, email, {PHONE_DIGITS.format('phone')}, cpf FROM users""",
+]
+
+
+def upgrade(db):
+    """Aplica em bancos existentes o que o db.create_all() não faz
+
+    O create_all só cria tabelas ausentes; colunas novas e índices de tabelas
+    que já existem precisam ser adicionados aqui. Todas as etapas são idempotentes.
+    """
+    inspector = inspect(db.engine)
+    with db.engine.begin() as conn:
+        for table, column, ddl in ADDED_COLUMNS:
+            columns = {c['name'] for c in inspector.get_columns(table)}
+            if column not in columns:
+                conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+
+        # Consulta o sqlite_master: a reflexão ignora índices com expressões
+        existing = set(conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'")).scalars())
+        for name in DROPPED_INDEXES:
+            if name in existing:
+                conn.execute(text(f'DROP INDEX {name}'))
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(conn)
+
+        # Tabela virtual e triggers são criados (e preenchidos) juntos, uma vez
+        if not conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'users_fts'")).first():
+            for statement in USERS_FTS:
+                conn.execute(text(statement))
@@ -0,0 +1,31 @@
+from models.user import db, get_brt_now
+
+
+class AllowlistChange(db.Model):
+    """Changelog versionado dos cartões autorizados (base do sync incremental dos leitores)"""
+    __tablename__ = 'allowlist_changes'
+    # AUTOINCREMENT garante versões estritamente crescentes, nunca reutilizadas
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    version = db.Column(db.Integer, primary_key=True)
+    nfc_uuid = db.Column(db.String(36), nullable=False)
+    op = db.Column(db.String(10), nullable=False)  # ADD, REMOVE
+    created_at = db.Column(db.DateTime, default=get_brt_now, nullable=False)
+
+    @staticmethod
+    def record(old_uuid, new_uuid):
+        """Adiciona à sessão as mudanças da troca de cartão (commitar junto com ela)"""
+        if old_uuid == new_uuid:
+            return
+        if old_uuid:
+            db.session.add(AllowlistChange(nfc_uuid=old_uuid, op='REMOVE'))
+        if new_uuid:
+            db.session.add(AllowlistChange(nfc_uuid=new_uuid, op='ADD'))
+
+    def to_dict(self):
+        return {
+            'version': self.version,
+            'nfc_uuid': self.nfc_uuid,
+            'op': self.op,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
@@ -0,0 +1,101 @@
+from collections import Counter
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models.user import db
+
+
+class DailyAccessRollup(db.Model):
+    """Contador de tentativas de acesso por (dia, ação, usuário)
+
+    Conta eventos, não linhas de `logs`: inclui as leituras repetidas somadas
+    em `repeat_count` e as tentativas negadas que só ficam em denied_card_stats.
+    É atualizado na mesma transação que grava os logs. O dia é a data local
+    (BRT) do evento. `user_id` é nulo para cartões não cadastrados; por isso a
+    unicidade usa `coalesce(user_id, 0)`.
+    """
+    __tablename__ = 'daily_access_rollup'
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    action = db.Column(db.String(50), nullable=False)
+    user_id = db.Column(db.Integer, nullable=True)
+    count = db.Column(db.Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        db.Index(
+            'ux_daily_access_rollup_key',
+            'day', 'action', db.func.coalesce(user_id, db.literal_column('0')),
+            unique=True
+        ),
+    )
+
+    @staticmethod
+    def add(events):
+        """Soma eventos de acesso nos contadores, na sessão atual
+
+        `events` são instâncias de Log ou dicts com timestamp, action, user_id
+        e, opcionalmente, count (padrão 1). Deve rodar na mesma transação que
+        insere os logs; os eventos negados entram antes de DeniedCardStat.aggregate.
+        """
+        groups = Counter()
+        for event in events:
+            if isinstance(event, dict):
+                key = (event['timestamp'].date(), event['action'], event.get('user_id'))
+                groups[key] += event.get('count', 1)
+            else:
+                groups[(event.timestamp.date(), event.action, event.user_id)] += 1
+        if not groups:
+            return
+
+        table = DailyAccessRollup.__table__
+        stmt = sqlite_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.day, table.c.action, db.func.coalesce(table.c.user_id, db.literal_column('0'))],
+            set_={'count': table.c.count + stmt.excluded.count}
+        )
+        db.session.execute(stmt, [
+            {'day': day, 'action': action, 'user_id': user_id, 'count': count}
+            for (day, action, user_id), count in groups.items()
+        ])
+
+    @staticmethod
+    def rebuild():
+        """Recalcula todos os contadores a partir de logs e denied_card_stats (na sessão atual)
+
+        As tentativas negadas vêm dos contadores por janela, contadas no dia
+        do início da janela; logs negados anteriores ao primeiro contador
+        (bancos antigos) vêm de `logs`.
+        """
+        from models.log import Log
+        from models.denied_card_stat import DeniedCardStat, DENIED_ACTIONS
+
+        table = DailyAccessRollup.__table__
+        cutoff = db.session.query(db.func.min(DeniedCardStat.bucket_start)).scalar()
+        logs = db.select(
+            db.func.date(Log.timestamp).label('day'), Log.action.label('action'),
+            Log.user_id.label('user_id'), Log.repeat_count.label('count')
+        )
+        if cutoff is not None:
+            logs = logs.filter(db.or_(Log.action.notin_(DENIED_ACTIONS), Log.timestamp < cutoff))
+        denied = db.select(
+            db.func.date(DeniedCardStat.bucket_start), DeniedCardStat.action,
+            db.null(), DeniedCardStat.count
+        )
+        events = db.union_all(logs, denied).subquery()
+        db.session.execute(table.delete())
+        db.session.execute(
+            table.insert().from_select(
+                ['day', 'action', 'user_id', 'count'],
+                db.select(events.c.day, events.c.action, events.c.user_id, db.func.sum(events.c['count']))
+                .group_by(events.c.day, events.c.action, events.c.user_id)
+            )
+        )
+
+    def to_dict(self):
+        return {
+            'day': self.day.isoformat() if self.day else None,
+            'action': self.action,
+            'user_id': self.user_id,
+            'count': self.count
+        }
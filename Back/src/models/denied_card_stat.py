@@ -0,0 +1,98 @@
+from datetime import datetime
+from collections import OrderedDict
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models.user import db, BRT
+
+# Ações de tentativas não autorizadas, agregadas em contadores
+DENIED_ACTIONS = ('ACCESS_DENIED', 'SYNC_NO_SESSION')
+
+
+class DeniedCardStat(db.Model):
+    """Contador de tentativas negadas por (cartão, ação, janela de tempo)"""
+    __tablename__ = 'denied_card_stats'
+    __table_args__ = (
+        # Listagem de /api/logs/denied, da tentativa mais recente para a mais antiga
+        db.Index('ix_denied_card_stats_last_seen', 'last_seen'),
+        # Contagem de tentativas por faixa de tempo (estatísticas e histograma)
+        db.Index('ix_denied_card_stats_bucket_start', 'bucket_start', 'action', 'count'),
+    )
+
+    nfc_uuid = db.Column(db.String(36), primary_key=True)
+    action = db.Column(db.String(50), primary_key=True)
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    count = db.Column(db.Integer, default=0, nullable=False)
+    first_seen = db.Column(db.DateTime, nullable=False)
+    last_seen = db.Column(db.DateTime, nullable=False)
+
+    @staticmethod
+    def bucket_of(timestamp, bucket_seconds):
+        epoch = int(timestamp.timestamp())
+        return datetime.fromtimestamp(epoch - epoch % bucket_seconds, BRT)
+
+    @staticmethod
+    def aggregate(rows, bucket_seconds, keep_first):
+        """Soma as tentativas negadas de `rows` nos contadores (na sessão atual)
+
+        Retorna as linhas que devem ir para `logs`: todas as demais ações e,
+        para cada (cartão, ação, janela), apenas os primeiros `keep_first`
+        eventos. Deve rodar na mesma transação que insere os logs.
+        """
+        groups = OrderedDict()
+        for index, row in enumerate(rows):
+            if row['action'] not in DENIED_ACTIONS:
+                continue
+            key = (row['nfc_uuid'], row['action'], DeniedCardStat.bucket_of(row['timestamp'], bucket_seconds))
+            groups.setdefault(key, []).append(index)
+
+        dropped = set()
+        table = DeniedCardStat.__table__
+        for (nfc_uuid, action, bucket_start), indexes in groups.items():
+            timestamps = [rows[i]['timestamp'] for i in indexes]
+            stmt = sqlite_insert(table).values(
+                nfc_uuid=nfc_uuid,
+                action=action,
+                bucket_start=bucket_start,
+                count=len(indexes),
+                first_seen=min(timestamps),
+                last_seen=max(timestamps)
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.nfc_uuid, table.c.action, table.c.bucket_start],
+                set_={
+                    'count': table.c.count + stmt.excluded.count,
+                    'last_seen': db.func.max(table.c.last_seen, stmt.excluded.last_seen)
+                }
+            ).returning(table.c.count)
+            total = db.session.execute(stmt).scalar_one()
+
+            previous = total - len(indexes)
+            keep = max(0, keep_first - previous)
+            dropped.update(indexes[keep:])
+
+        return [row for index, row in enumerate(rows) if index not in dropped]
+
+    @staticmethod
+    def add_repeats(nfc_uuid, action, timestamp, repeats, bucket_seconds):
+        """Soma leituras repetidas (debounce) ao contador da janela do evento original"""
+        table = DeniedCardStat.__table__
+        db.session.execute(
+            table.update()
+            .where(
+                table.c.nfc_uuid == nfc_uuid,
+                table.c.action == action,
+                table.c.bucket_start == DeniedCardStat.bucket_of(timestamp, bucket_seconds)
+            )
+            .values(count=table.c.count + repeats)
+        )
+
+    def to_dict(self):
+        return {
+            'nfc_uuid': self.nfc_uuid,
+            'action': self.action,
+            'bucket_start': self.bucket_start.isoformat() if self.bucket_start else None,
+            'count': self.count,
+            'first_seen': self.first_seen.isoformat() if self.first_seen else None,
+            'last_seen': self.last_seen.isoformat() if self.last_seen else None
+        }
@@ -3,6 +3,17 @@ from datetime import datetime
 
 class Log(db.Model):
     __tablename__ = 'logs'
+    __table_args__ = (
+        # Localiza o log original ao somar leituras repetidas (repeat_count)
+        db.Index('ix_logs_nfc_uuid_timestamp', 'nfc_uuid', 'timestamp'),
+        # Paginação por cursor em (timestamp, id), percorrido em ordem decrescente
+        db.Index('ix_logs_timestamp_id', 'timestamp', 'id'),
+        # Contagens por faixa de tempo (estatísticas e histograma) sem ler as linhas
+        db.Index('ix_logs_timestamp_counts', 'timestamp', 'action', 'user_exists', 'repeat_count'),
+        # Filtros por usuário e por ação, na ordem da listagem
+        db.Index('ix_logs_user_id_timestamp', 'user_id', 'timestamp'),
+        db.Index('ix_logs_action_timestamp', 'action', 'timestamp'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
@@ -10,6 +21,8 @@ class Log(db.Model):
     user_exists = db.Column(db.Boolean, default=True, nullable=False)
     action = db.Column(db.String(50), default='ACCESS', nullable=False)  # REGISTER, LINK, UNLINK, ACCESS_GRANTED, ACCESS_DENIED
     timestamp = db.Column(db.DateTime, default=get_brt_now, nullable=False)
+    # Leituras repetidas do mesmo cartão agrupadas neste log (debounce)
+    repeat_count = db.Column(db.Integer, default=1, server_default='1', nullable=False)
     
     # Relacionamento com User
     user = db.relationship('User', backref='logs')
@@ -21,5 +34,6 @@ class Log(db.Model):
             'nfc_uuid': self.nfc_uuid,
             'user_exists': self.user_exists,
             'action': self.action,
-            'timestamp': self.timestamp.isoformat() if self.timestamp else None
+            'timestamp': self.timestamp.isoformat() if self.timestamp else None,
+            'repeat_count': self.repeat_count
         }
\ No newline at end of file
@@ -1,11 +1,15 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from .user import db, get_brt_now
 
 
 class PairingSession(db.Model):
     __tablename__ = 'pairing_sessions'
+    __table_args__ = (
+        # Sessão pendente mais recente usada pelo /api/nfc/sync
+        Index('ix_pairing_sessions_vinculado_expires_at', 'vinculado', 'expires_at', 'created_at'),
+    )
 
     id = Column(Integer, primary_key=True)
     pair_token = Column(String(64), unique=True, nullable=False)
@@ -0,0 +1,9 @@
+from models.user import db
+
+
+class SpoolCheckpoint(db.Model):
+    """Posição (em bytes) até onde um segmento do spool já foi carregado em `logs`"""
+    __tablename__ = 'spool_checkpoints'
+
+    segment = db.Column(db.String(64), primary_key=True)
+    offset = db.Column(db.Integer, default=0, nullable=False)
@@ -10,8 +10,26 @@ def get_brt_now():
     """Retorna o datetime atual em BRT"""
     return datetime.now(BRT)
 
+# Filtros has_nfc da listagem ('' também é "sem cartão"). Os índices parciais
+# repetem o mesmo texto: o SQLite só os usa se a consulta trouxer o mesmo predicado
+WITH_NFC = "nfc_card_uuid IS NOT NULL AND nfc_card_uuid != ''"
+WITHOUT_NFC = "coalesce(nfc_card_uuid, '') = ''"
+
 class User(db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        # Ordenações da listagem paginada (o rowid completa a chave do cursor)
+        db.Index('ix_users_name', 'name'),
+        db.Index('ix_users_created_at', 'created_at'),
+        db.Index('ix_users_updated_at', 'updated_at'),
+        # As mesmas ordenações com ?has_nfc=true|false
+        db.Index('ix_users_name_with_nfc', 'name', sqlite_where=db.text(WITH_NFC)),
+        db.Index('ix_users_created_at_with_nfc', 'created_at', sqlite_where=db.text(WITH_NFC)),
+        db.Index('ix_users_updated_at_with_nfc', 'updated_at', sqlite_where=db.text(WITH_NFC)),
+        db.Index('ix_users_name_without_nfc', 'name', sqlite_where=db.text(WITHOUT_NFC)),
+        db.Index('ix_users_created_at_without_nfc', 'created_at', sqlite_where=db.text(WITHOUT_NFC)),
+        db.Index('ix_users_updated_at_without_nfc', 'updated_at', sqlite_where=db.text(WITHOUT_NFC)),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
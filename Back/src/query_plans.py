@@ -0,0 +1,196 @@
+import re
+from datetime import datetime
+
+from sqlalchemy import select, update
+
+from models.user import db, User, WITH_NFC, WITHOUT_NFC
+from models.log import Log
+from models.pairing import PairingSession
+from models.allowlist_change import AllowlistChange
+from models.denied_card_stat import DeniedCardStat, DENIED_ACTIONS
+from models.daily_access_rollup import DailyAccessRollup
+
+# Acesso a uma tabela no plano: "SCAN logs", "SCAN TABLE logs" (SQLite < 3.36),
+# "SEARCH logs USING INDEX ix (...)", "SCAN users USING COVERING INDEX ix"...
+TABLE_ACCESS = re.compile(r'^(SCAN|SEARCH) (?:TABLE )?(\w+)(?: AS \w+)?(?: (.*))?$')
+
+# Buscas aceitas: por índice (exceto os automáticos, criados a cada execução)
+# ou pela chave primária (rowid); "SEARCH t" sem USING é o max/min do rowid
+INDEXED_SEARCH = re.compile(r'^(?:$|USING (?:(?:COVERING )?INDEX \w+|INTEGER PRIMARY KEY)\b)')
+FULL_INDEX_SCAN = re.compile(r'^USING (?:COVERING )?INDEX (\w+)$')
+
+# Varreduras completas (de tabela ou de índice) aceitas, uma a uma:
+# (detalhe do plano, SQL da consulta com espaços normalizados, motivo)
+ALLOWED_SCANS = [
+    (r'^SCAN users USING COVERING INDEX \w+$', r'^SELECT count\(users\.id\)',
+     'total de usuários (/api/users e /api/stats): COUNT lê um índice inteiro de users; '
+     'o resultado fica no cache de estatísticas'),
+    (r'^SCAN daily_access_rollup$', r' FROM daily_access_rollup GROUP BY ',
+     '/api/stats sem from/to: os totais de todo o histórico somam o rollup inteiro '
+     '(uma linha por dia, ação e usuário, não por log)'),
+    (r'^SCAN (logs|users|denied_card_stats) USING INDEX \w+$',
+     r' FROM (logs|users|denied_card_stats) ORDER BY [^()]* LIMIT \?',
+     'primeira página de uma listagem sem filtro (/api/logs, /api/users, /api/logs/denied, '
+     'exportação): percorre o índice da ordenação e para no LIMIT'),
+    (r'^SCAN users USING INDEX ix_users_\w+_with(out)?_nfc$',
+     r" FROM users WHERE (nfc_card_uuid IS NOT NULL AND nfc_card_uuid != ''|coalesce\(nfc_card_uuid, ''\) = '') "
+     r'ORDER BY [^()]* LIMIT \?',
+     'primeira página de /api/users com has_nfc: o índice parcial só tem linhas do filtro, '
+     'então a leitura também para no LIMIT'),
+]
+
+
+def app_queries():
+    """Consultas feitas pelas rotas do app.py, como (rota, statement)"""
+    now = datetime(2024, 1, 1)
+    day = now.date()
+    bucket_index = db.cast(
+        (db.cast(db.func.strftime('%s', db.func.substr(Log.timestamp, 1, 19)), db.Integer) - 0) / 3600, db.Integer
+    )
+    with_nfc = db.func.count(db.case((db.func.coalesce(User.nfc_card_uuid, '') != '', 1)))
+    return [
+        ('GET /api/users?sort=name', select(User).order_by(User.name, User.id).limit(101)),
+        ('GET /api/users?cursor=&has_nfc=true',
+         select(User).filter(db.text(WITH_NFC), db.tuple_(User.created_at, User.id) < (now, 1))
+         .order_by(User.created_at.desc(), User.id.desc()).limit(101)),
+        ('GET /api/users?sort=name&has_nfc=false',
+         select(User).filter(db.text(WITHOUT_NFC)).order_by(User.name, User.id).limit(101)),
+        ('GET /api/users?sort=updated_at&has_nfc=true',
+         select(User).filter(db.text(WITH_NFC)).order_by(User.updated_at, User.id).limit(101)),
+        ('GET /api/users (total)', select(db.func.count(User.id))),
+        ('GET/PUT/DELETE /api/users/cpf/<cpf>, /link, /unlink, /pair_start',
+         select(User).filter_by(cpf='00000000000').limit(1)),
+        ('cache de autorização (cartão fora do cache)',
+         select(User).filter_by(nfc_card_uuid='00:00').limit(1)),
+        ('/api/nfc/sync, /api/nfc/pair_status (usuário da sessão)', select(User).filter_by(id=1)),
+        ('cache de autorização e GET /api/nfc/allowlist',
+         select(User.nfc_card_uuid).filter(User.nfc_card_uuid.isnot(None))),
+        ('POST /api/nfc/validate/batch',
+         select(User.id, User.nfc_card_uuid).filter(User.nfc_card_uuid.in_(
+             select(db.func.json_each('["a", "b"]').table_valued('value').c.value)
+         ))),
+        ('GET /api/nfc/allowlist?since=',
+         select(AllowlistChange).filter(AllowlistChange.version > 0).order_by(AllowlistChange.version)),
+        ('POST /api/nfc/sync (sessão pendente)',
+         select(PairingSession)
+         .filter(PairingSession.vinculado == False, PairingSession.expires_at > now)
+         .order_by(PairingSession.created_at.desc()).limit(1)),
+        ('stream SSE (sessões novas)',
+         select(PairingSession).filter(PairingSession.id > 0).order_by(PairingSession.id)),
+        ('stream SSE (sessões pendentes)',
+         select(PairingSession).filter(PairingSession.id.in_([1, 2]))),
+        ('GET /api/nfc/pair_status/<pair_token>',
+         select(PairingSession).filter_by(pair_token='t').limit(1)),
+        ('GET /api/logs?after_id=, stream SSE', select(Log).filter(Log.id > 0).order_by(Log.id).limit(101)),
+        ('GET /api/logs', select(Log).order_by(Log.timestamp.desc(), Log.id.desc()).limit(101)),
+        ('GET /api/logs?cursor=',
+         select(Log).filter(db.tuple_(Log.timestamp, Log.id) < (now, 1))
+         .order_by(Log.timestamp.desc(), Log.id.desc()).limit(101)),
+        ('GET /api/logs?user_id=&from=',
+         select(Log).filter(Log.user_id == 1, Log.timestamp >= now)
+         .order_by(Log.timestamp.desc(), Log.id.desc()).limit(101)),
+        ('GET /api/logs?nfc_uuid=&action=',
+         select(Log).filter(Log.nfc_uuid == 'x', Log.action == 'ACCESS_DENIED')
+         .order_by(Log.timestamp.desc(), Log.id.desc()).limit(101)),
+        ('GET /api/logs?action=&to= (uma consulta por ação)',
+         select(Log).filter(Log.timestamp < now, Log.action == 'ACCESS_DENIED')
+         .order_by(Log.timestamp.desc(), Log.id.desc()).limit(101)),
+        ('GET /api/logs/export?user_id= (lotes seguintes)',
+         select(Log).filter(Log.user_id == 1, db.tuple_(Log.timestamp, Log.id) > (now, 1))
+         .order_by(Log.timestamp, Log.id).limit(1000)),
+        ('GET /api/logs/export?action= (lotes seguintes, uma consulta por ação)',
+         select(Log).filter(db.tuple_(Log.timestamp, Log.id) > (now, 1), Log.action == 'ACCESS_DENIED')
+         .order_by(Log.timestamp, Log.id).limit(1000)),
+        ('carga do spool (repeat_count)',
+         update(Log).where(Log.nfc_uuid == 'x', Log.timestamp == now, Log.action == 'ACCESS_DENIED')
+         .values(repeat_count=Log.repeat_count + 1)),
+        ('GET /api/stats (usuários)', select(db.func.count(User.id), with_nfc)),
+        ('GET /api/stats (faixa parcial)',
+         select(Log.action, Log.user_exists, db.func.sum(Log.repeat_count))
+         .filter(Log.timestamp >= now, Log.timestamp < now, Log.action.notin_(DENIED_ACTIONS))
+         .group_by(Log.user_exists, Log.action)),
+        ('GET /api/stats?from= (faixa aberta)',
+         select(Log.action, Log.user_exists, db.func.sum(Log.repeat_count))
+         .filter(Log.timestamp >= now, Log.action.notin_(DENIED_ACTIONS))
+         .group_by(Log.user_exists, Log.action)),
+        ('GET /api/stats (negadas anteriores aos contadores)',
+         select(Log.action, Log.user_exists, db.func.sum(Log.repeat_count))
+         .filter(Log.timestamp >= now, Log.timestamp < now, Log.timestamp < now, Log.action.in_(DENIED_ACTIONS))
+         .group_by(Log.user_exists, Log.action)),
+        ('GET /api/stats (faixa parcial, negadas agregadas)',
+         select(DeniedCardStat.action, db.func.sum(DeniedCardStat.count))
+         .filter(DeniedCardStat.bucket_start >= now, DeniedCardStat.bucket_start < now)
+         .group_by(DeniedCardStat.action)),
+        ('GET /api/stats, /api/stats/histogram (início dos contadores de negadas)',
+         select(db.func.min(DeniedCardStat.bucket_start))),
+        ('GET /api/stats (dias inteiros)',
+         select(DailyAccessRollup.action, DailyAccessRollup.user_id.isnot(None), db.func.sum(DailyAccessRollup.count))
+         .filter(DailyAccessRollup.day >= day, DailyAccessRollup.day < day)
+         .group_by(DailyAccessRollup.action, DailyAccessRollup.user_id.isnot(None))),
+        ('GET /api/stats/histogram (minuto/hora)',
+         select(bucket_index, Log.action, Log.user_exists, db.func.sum(Log.repeat_count))
+         .filter(Log.timestamp >= now, Log.timestamp < now, Log.action.notin_(DENIED_ACTIONS))
+         .group_by(Log.user_exists, Log.action, bucket_index)),
+        ('GET /api/logs/denied',
+         select(DeniedCardStat).order_by(DeniedCardStat.last_seen.desc()).limit(100)),
+    ]
+
+
+def explain(connection, statement, parameters=()):
+    """Retorna as linhas de detalhe do EXPLAIN QUERY PLAN de um SQL já compilado"""
+    rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, tuple(parameters))
+    return [row[-1] for row in rows]
+
+
+def table_names(connection):
+    """Tabelas do banco (inclusive as pequenas: toda tabela é verificada)"""
+    return set(connection.exec_driver_sql(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+    ).scalars())
+
+
+def plan_problems(plan, statement, tables):
+    """Acessos do plano que não usam índice nem a chave primária, ou que leem um índice inteiro
+
+    Varreduras listadas em ALLOWED_SCANS não contam. Tabelas virtuais (FTS5,
+    json_each) e subconsultas ficam de fora: não são lidas por b-tree.
+    """
+    sql = ' '.join(statement.split())
+    problems = []
+    for detail in plan:
+        match = TABLE_ACCESS.match(detail)
+        if not match or match.group(2) not in tables:
+            continue
+        kind, table, using = match.group(1), match.group(2), match.group(3) or ''
+        if using.startswith('VIRTUAL TABLE'):
+            continue
+        if kind == 'SEARCH' and INDEXED_SEARCH.match(using):
+            continue
+        if any(re.search(allowed, detail) and re.search(query, sql) for allowed, query, _ in ALLOWED_SCANS):
+            continue
+        index = FULL_INDEX_SCAN.match(using) if kind == 'SCAN' else None
+        if index:
+            problems.append(f'varredura completa do índice {index.group(1)} de {table}')
+        else:
+            problems.append(f'acesso a {table} sem índice ({detail})')
+    return problems
+
+
+def report(out=print):
+    """Imprime o plano de cada consulta das rotas; retorna os problemas encontrados"""
+    failures = []
+    with db.engine.connect() as connection:
+        tables = table_names(connection)
+        for route, statement in app_queries():
+            compiled = statement.compile(dialect=connection.dialect, compile_kwargs={'render_postcompile': True})
+            # O plano não depende dos valores: parâmetros nulos bastam
+            plan = explain(connection, str(compiled), [None] * len(compiled.positiontup))
+            problems = plan_problems(plan, str(compiled), tables)
+            out(f'[{"FALHA" if problems else "OK"}] {route}')
+            for detail in plan:
+                out(f'    {detail}')
+            for problem in problems:
+                out(f'    -> {problem}')
+            if problems:
+                failures.append((route, problems))
+    return failures
@@ -0,0 +1 @@
+# Arquivo vazio para tornar services um pacote Python
@@ -0,0 +1,127 @@
+import fcntl
+import json
+import os
+import threading
+import time
+
+
+class AccessSpool:
+    """Spool append-only em disco para eventos de acesso
+
+    Cada processo grava em segmentos próprios (`<ns>-<pid>.spool`, um evento
+    JSON por linha) e mantém um flock exclusivo sobre eles. Segmentos sem
+    lock pertencem a processos encerrados e são adotados por quem os
+    encontrar primeiro, para que sejam recarregados após um reinício.
+    """
+
+    SUFFIX = '.spool'
+
+    def __init__(self, directory, segment_max_bytes=4 * 1024 * 1024):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._fds = {}          # segmento -> fd com flock (próprios e adotados)
+        self._sizes = {}        # segmento próprio -> bytes gravados
+        self._active = None
+        self._unsynced = False
+        self.appended = 0       # eventos gravados por este processo
+
+        self._adopt_orphans()
+        self._open_segment()
+
+    def _path(self, segment):
+        return os.path.join(self.directory, segment)
+
+    def _adopt_orphans(self):
+        for segment in sorted(os.listdir(self.directory)):
+            if not segment.endswith(self.SUFFIX):
+                continue
+            fd = os.open(self._path(segment), os.O_RDONLY)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Segmento ativo de outro processo
+                os.close(fd)
+                continue
+            self._fds[segment] = fd
+
+    def _open_segment(self):
+        segment = f'{time.time_ns():020d}-{os.getpid()}{self.SUFFIX}'
+        fd = os.open(self._path(segment), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        self._fds[segment] = fd
+        self._sizes[segment] = 0
+        self._active = segment
+
+    def append(self, record):
+        """Acrescenta um evento ao segmento ativo (fsync feito em lote por sync())"""
+        line = (json.dumps(record, separators=(',', ':')) + '\n').encode()
+        with self._lock:
+            os.write(self._fds[self._active], line)
+            self._sizes[self._active] += len(line)
+            self._unsynced = True
+            self.appended += 1
+            if self._sizes[self._active] >= self.segment_max_bytes:
+                os.fsync(self._fds[self._active])
+                self._unsynced = False
+                self._open_segment()
+
+    def sync(self):
+        """fsync do segmento ativo, agrupando todos os eventos desde o último"""
+        with self._lock:
+            if self._unsynced:
+                os.fsync(self._fds[self._active])
+                self._unsynced = False
+
+    def segments(self):
+        """Segmentos sob responsabilidade deste processo, do mais antigo ao mais novo"""
+        with self._lock:
+            return sorted(self._fds)
+
+    def is_own(self, segment):
+        return segment in self._sizes
+
+    def is_sealed(self, segment):
+        """Segmento que não receberá mais eventos (rotacionado ou adotado)"""
+        return segment != self._active
+
+    def read(self, segment, offset, max_records):
+        """Lê até `max_records` eventos completos a partir de `offset`
+
+        Retorna (eventos, novo_offset). Linhas truncadas por uma queda no meio
+        da escrita são ignoradas quando o segmento já está selado.
+        """
+        records = []
+        with open(self._path(segment), 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    if self.is_sealed(segment):
+                        offset += len(line)
+                    break
+                offset += len(line)
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+                if len(records) >= max_records:
+                    break
+        return records, offset
+
+    def size(self, segment):
+        return os.fstat(self._fds[segment]).st_size
+
+    def remove(self, segment):
+        """Apaga um segmento selado já carregado por completo"""
+        with self._lock:
+            os.unlink(self._path(segment))
+            os.close(self._fds.pop(segment))
+            self._sizes.pop(segment, None)
+
+    def close(self):
+        with self._lock:
+            for fd in self._fds.values():
+                os.close(fd)
+            self._fds = {}
@@ -0,0 +1,130 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from models.user import db, User
+from models.allowlist_change import AllowlistChange
+
+# Entrada de autorização de um cartão: dados mínimos para decidir o acesso
+# e o snapshot serializado do usuário devolvido pela rota de validação
+AuthEntry = namedtuple('AuthEntry', ['user_id', 'name', 'user'])
+
+
+class AuthorizationCache:
+    """Cache em memória de UUID do cartão NFC -> entrada de autorização
+
+    Também guarda, por até `negative_ttl` segundos, os UUIDs que não estão
+    cadastrados (limitado a `negative_size` entradas), para que leitores mal
+    configurados ou tentativas de força bruta não consultem `users` a cada
+    leitura. O TTL limita a defasagem quando o vínculo é feito em outro processo.
+
+    Vínculos desfeitos em outro processo (outro worker do gunicorn) são
+    percebidos por sync(), que lê o changelog da allowlist a cada
+    `sync_interval` segundos e invalida os cartões alterados.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._negatives = OrderedDict()  # UUID desconhecido -> expiração (monotonic)
+        self._lock = threading.Lock()
+        # Incrementado a cada invalidação; impede que uma leitura do banco
+        # iniciada antes de uma escrita grave no cache um valor antigo
+        self._generation = 0
+        self.negative_size = 10000
+        self.negative_ttl = 30
+        self.sync_interval = 1
+        self._app = None
+        self._version = 0  # última versão do changelog da allowlist já aplicada
+        self._next_sync = 0
+
+    def init_app(self, app):
+        self._app = app
+        self.negative_size = app.config.get('NFC_NEGATIVE_CACHE_SIZE', 10000)
+        self.negative_ttl = app.config.get('NFC_NEGATIVE_CACHE_TTL', 30)
+        self.sync_interval = app.config.get('NFC_CACHE_SYNC_INTERVAL', 1)
+        with app.app_context():
+            self.warm()
+
+    @staticmethod
+    def _entry_for(user):
+        return AuthEntry(user_id=user.id, name=user.name, user=user.to_dict())
+
+    def warm(self):
+        """Carrega todos os cartões vinculados (executar dentro de app_context)"""
+        # Lida antes dos usuários: uma mudança entre as duas consultas é reaplicada pelo sync()
+        version = db.session.query(db.func.max(AllowlistChange.version)).scalar() or 0
+        users = User.query.filter(User.nfc_card_uuid.isnot(None)).all()
+        entries = {user.nfc_card_uuid: self._entry_for(user) for user in users}
+        with self._lock:
+            self._entries = entries
+            self._version = version
+            self._generation += 1
+
+    def get(self, nfc_uuid):
+        """Retorna a entrada do cartão ou None; só consulta o banco em caso de ausência"""
+        entry = self._entries.get(nfc_uuid)
+        if entry is not None:
+            return entry
+
+        expires_at = self._negatives.get(nfc_uuid)
+        if expires_at is not None and expires_at > time.monotonic():
+            return None
+
+        generation = self._generation
+        user = User.query.filter_by(nfc_card_uuid=nfc_uuid).first()
+        if not user:
+            with self._lock:
+                if generation == self._generation:
+                    self._negatives[nfc_uuid] = time.monotonic() + self.negative_ttl
+                    self._negatives.move_to_end(nfc_uuid)
+                    if len(self._negatives) > self.negative_size:
+                        self._negatives.popitem(last=False)
+            return None
+
+        entry = self._entry_for(user)
+        with self._lock:
+            if generation == self._generation:
+                self._entries[nfc_uuid] = entry
+        return entry
+
+    def invalidate(self, *nfc_uuids):
+        """Remove do cache os cartões cuja vinculação mudou (chamar após o commit)"""
+        with self._lock:
+            self._generation += 1
+            for nfc_uuid in nfc_uuids:
+                if nfc_uuid:
+                    self._entries.pop(nfc_uuid, None)
+                    self._negatives.pop(nfc_uuid, None)
+
+    def sync(self, force=False):
+        """Invalida os cartões que mudaram no changelog desde a última leitura
+
+        Registrado como tick da thread do log-writer; consulta o banco no
+        máximo a cada `sync_interval` segundos (a faixa usa a chave primária).
+        """
+        now = time.monotonic()
+        if now < self._next_sync:
+            return
+        self._next_sync = now + self.sync_interval
+        try:
+            with self._app.app_context():
+                changes = (
+                    db.session.query(AllowlistChange.version, AllowlistChange.nfc_uuid)
+                    .filter(AllowlistChange.version > self._version)
+                    .all()
+                )
+        except Exception:
+            self._app.logger.exception('Falha ao ler o changelog da allowlist')
+            return
+        if changes:
+            self.invalidate(*{nfc_uuid for _, nfc_uuid in changes})
+            self._version = max(version for version, _ in changes)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries = {}
+            self._negatives = OrderedDict()
+
+
+auth_cache = AuthorizationCache()
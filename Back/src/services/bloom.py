@@ -0,0 +1,154 @@
+import math
+import struct
+import threading
+
+from models.user import db, User
+from models.allowlist_change import AllowlistChange
+
+FNV_PRIME = 16777619
+FNV_OFFSET = 2166136261
+# Segunda base de offset do FNV-1a, usada para derivar o segundo hash
+FNV_OFFSET_ALT = 0x5BD1E995
+
+# Cabeçalho do binário: magic, bits (m), hashes (k), versão da allowlist
+HEADER = struct.Struct('<4sIII')
+MAGIC = b'BLM1'
+
+
+def fnv1a_32(data, offset=FNV_OFFSET):
+    h = offset
+    for byte in data:
+        h ^= byte
+        h = (h * FNV_PRIME) & 0xFFFFFFFF
+    return h
+
+
+class CountingBloomFilter:
+    """Bloom filter com contadores, para permitir remoções incrementais
+
+    O formato servido aos leitores é apenas o mapa de bits (contador > 0).
+    Posição do i-ésimo hash: (h1 + i * h2) mod m, com h1/h2 = FNV-1a 32 bits
+    do UUID em UTF-8 com as bases FNV_OFFSET e FNV_OFFSET_ALT.
+    """
+
+    def __init__(self, capacity, fp_rate):
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.num_bits = max(8, math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._counters = bytearray(self.num_bits)
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        data = item.encode()
+        h1 = fnv1a_32(data)
+        h2 = fnv1a_32(data, FNV_OFFSET_ALT) | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, item):
+        for pos in self._positions(item):
+            if self._counters[pos] == 0:
+                self._bits[pos >> 3] |= 1 << (pos & 7)
+            if self._counters[pos] < 255:
+                self._counters[pos] += 1
+        self.count += 1
+
+    def remove(self, item):
+        for pos in self._positions(item):
+            # Contador saturado nunca é decrementado (evita falsos negativos)
+            if 0 < self._counters[pos] < 255:
+                self._counters[pos] -= 1
+                if self._counters[pos] == 0:
+                    self._bits[pos >> 3] &= ~(1 << (pos & 7))
+        self.count -= 1
+
+    def __contains__(self, item):
+        return all(self._counters[pos] for pos in self._positions(item))
+
+    def to_bits(self):
+        """Mapa de bits little-endian: bit `pos` = byte pos >> 3, máscara 1 << (pos & 7)"""
+        return bytes(self._bits)
+
+
+class AllowlistBloom:
+    """Bloom filter dos cartões autorizados, mantido a partir do changelog da allowlist"""
+
+    def __init__(self, fp_rate):
+        self.fp_rate = fp_rate
+        self.version = 0
+        self._members = set()
+        self._filter = None
+        self._payload = None
+        self._lock = threading.Lock()
+
+    def _rebuild(self):
+        self.version = db.session.query(db.func.max(AllowlistChange.version)).scalar() or 0
+        self._members = {
+            card_uuid for (card_uuid,) in
+            db.session.query(User.nfc_card_uuid).filter(User.nfc_card_uuid.isnot(None))
+        }
+        # Folga de 2x para absorver novos cartões sem reconstruir
+        self._filter = CountingBloomFilter(max(len(self._members) * 2, 1024), self.fp_rate)
+        for card_uuid in self._members:
+            self._filter.add(card_uuid)
+
+    def _apply_changes(self):
+        changes = (
+            db.session.query(AllowlistChange.version, AllowlistChange.nfc_uuid, AllowlistChange.op)
+            .filter(AllowlistChange.version > self.version)
+            .order_by(AllowlistChange.version)
+            .all()
+        )
+        for version, card_uuid, op in changes:
+            if op == 'ADD' and card_uuid not in self._members:
+                self._members.add(card_uuid)
+                self._filter.add(card_uuid)
+            elif op == 'REMOVE' and card_uuid in self._members:
+                self._members.discard(card_uuid)
+                self._filter.remove(card_uuid)
+            self.version = version
+        return bool(changes)
+
+    def snapshot(self):
+        """Retorna (etag sem aspas, payload binário) atualizados com o changelog (dentro de app_context)"""
+        with self._lock:
+            if self._filter is None:
+                self._rebuild()
+                self._payload = None
+            elif self._apply_changes():
+                self._payload = None
+                if self._filter.count > self._filter.capacity:
+                    self._rebuild()
+
+            if self._payload is None:
+                self._payload = HEADER.pack(
+                    MAGIC, self._filter.num_bits, self._filter.num_hashes, self.version
+                ) + self._filter.to_bits()
+
+            etag = f'{self.version}-{self._filter.num_bits}-{self._filter.num_hashes}'
+            return etag, self._payload
+
+
+class AllowlistBloomRegistry:
+    """Um filtro por taxa de falsos positivos solicitada (no máximo `max_filters`)"""
+
+    def __init__(self, max_filters=8):
+        self.max_filters = max_filters
+        self._filters = {}
+        self._lock = threading.Lock()
+
+    def get(self, fp_rate):
+        with self._lock:
+            bloom = self._filters.pop(fp_rate, None)
+            if bloom is None:
+                bloom = AllowlistBloom(fp_rate)
+                if len(self._filters) >= self.max_filters:
+                    # Descarta o filtro usado há mais tempo
+                    self._filters.pop(next(iter(self._filters)))
+            self._filters[fp_rate] = bloom
+            return bloom
+
+
+allowlist_blooms = AllowlistBloomRegistry()
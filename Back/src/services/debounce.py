@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Window:
+    __slots__ = ('expires_at', 'event', 'repeats')
+
+    def __init__(self, expires_at, event):
+        self.expires_at = expires_at
+        self.event = event
+        self.repeats = 0
+
+
+class SwipeDebouncer:
+    """Agrupa leituras repetidas do mesmo cartão, pelo mesmo leitor, numa janela
+
+    A primeira leitura abre a janela e gera o log normalmente; as repetições
+    dentro de `window` segundos só incrementam um contador em memória. Quando
+    a janela expira, `emit(event, repeats)` é chamado uma vez para somar as
+    repetições ao log original (campo repeat_count).
+    """
+
+    def __init__(self):
+        self.window = 1.5
+        self._emit = None
+        self._windows = OrderedDict()  # chave -> _Window, em ordem de expiração
+        self._lock = threading.Lock()
+
+    def init_app(self, app, emit):
+        self.window = app.config.get('NFC_DEBOUNCE_MS', 1500) / 1000
+        self._emit = emit
+
+    def hit(self, key):
+        """True se a leitura cai numa janela aberta (e conta como repetição)"""
+        if self.window <= 0:
+            return False
+        with self._lock:
+            window = self._windows.get(key)
+            if window is not None and window.expires_at > time.monotonic():
+                window.repeats += 1
+                return True
+        return False
+
+    def open(self, key, event):
+        """Abre uma janela para a leitura `event` que acabou de ser registrada"""
+        if self.window <= 0:
+            return
+        with self._lock:
+            closed = self._windows.pop(key, None)
+            self._windows[key] = _Window(time.monotonic() + self.window, event)
+        if closed is not None and closed.repeats:
+            self._emit(closed.event, closed.repeats)
+
+    def sweep(self, force=False):
+        """Fecha as janelas expiradas (ou todas, com force=True)"""
+        now = time.monotonic()
+        closed = []
+        with self._lock:
+            while self._windows:
+                key, window = next(iter(self._windows.items()))
+                if not force and window.expires_at > now:
+                    break
+                del self._windows[key]
+                closed.append(window)
+        for window in closed:
+            if window.repeats:
+                self._emit(window.event, window.repeats)
+
+
+swipe_debouncer = SwipeDebouncer()
@@ -0,0 +1,197 @@
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from models.user import db
+from models.log import Log
+from models.pairing import PairingSession
+
+
+class _Subscriber:
+    __slots__ = ('types', 'pair_token', 'frames', 'overflowed', 'max_pending')
+
+    def __init__(self, types, pair_token, max_pending):
+        self.types = types
+        self.pair_token = pair_token
+        self.frames = deque()
+        self.overflowed = False
+        self.max_pending = max_pending
+
+    def accepts(self, event_type, data):
+        if self.types and event_type not in self.types:
+            return False
+        if self.pair_token and event_type == 'pairing':
+            return data.get('pair_token') == self.pair_token
+        return True
+
+
+class EventBroker:
+    """Fan-out em memória de eventos para clientes Server-Sent Events
+
+    Os eventos vêm de tail(), que lê do banco os logs e as mudanças de
+    pareamento confirmados por qualquer processo (outros workers do gunicorn
+    inclusive): uma consulta por ciclo no processo, qualquer que seja o número
+    de clientes. Cada evento é serializado uma única vez no publish e o mesmo
+    frame é entregue a todos os inscritos. Os
+    últimos `replay_size` eventos ficam num buffer para retomar a conexão via
+    Last-Event-ID. Cada cliente tem no máximo `client_queue_size` frames
+    pendentes; um cliente mais lento que isso é desconectado e, ao reconectar,
+    retoma do buffer (ou recebe `reset` se o ponto de retomada já saiu dele).
+    """
+
+    def __init__(self):
+        # Prefixo dos ids: ids de uma execução anterior do servidor não são retomáveis
+        self.boot = str(int(time.time()))
+        self._seq = 0
+        self._replay = deque(maxlen=1000)  # (seq, tipo, dados, frame)
+        self._subscribers = set()
+        self._cond = threading.Condition()
+        self.client_queue_size = 256
+        self.keepalive = 15
+        self.tail_interval = 0.25
+        self.tail_batch_size = 1000
+        self._next_tail = 0
+        self._last_log_id = 0
+        self._last_session_id = 0
+        self._pending_sessions = set()  # sessões de pareamento ainda não vinculadas
+        self._app = None
+
+    def init_app(self, app):
+        self._replay = deque(maxlen=app.config.get('SSE_REPLAY_BUFFER', 1000))
+        self.client_queue_size = app.config.get('SSE_CLIENT_QUEUE_SIZE', 256)
+        self.keepalive = app.config.get('SSE_KEEPALIVE_SECONDS', 15)
+        self.tail_interval = app.config.get('SSE_TAIL_INTERVAL', 0.25)
+        self.tail_batch_size = app.config.get('SSE_TAIL_BATCH_SIZE', 1000)
+        self._app = app
+        # Só o que for confirmado daqui em diante vira evento
+        with app.app_context():
+            self._last_log_id = db.session.query(db.func.max(Log.id)).scalar() or 0
+            self._last_session_id = db.session.query(db.func.max(PairingSession.id)).scalar() or 0
+            self._pending_sessions = {
+                session_id for (session_id,) in
+                db.session.query(PairingSession.id)
+                .filter(PairingSession.vinculado == False, PairingSession.expires_at > datetime.utcnow())
+            }
+
+    def tail(self, force=False):
+        """Publica os logs e as mudanças de pareamento confirmados desde a última leitura
+
+        Registrado como tick da thread do log-writer; consulta o banco no
+        máximo a cada `tail_interval` segundos. Logs e sessões novos são lidos
+        por faixa de id (chave primária): como o SQLite serializa as escritas,
+        um id menor nunca é confirmado depois de um maior já lido. Sessões
+        pendentes (poucas, expiram em segundos) são relidas por id para
+        detectar o vínculo.
+        """
+        now = time.monotonic()
+        if now < self._next_tail:
+            return
+        self._next_tail = now + self.tail_interval
+        try:
+            with self._app.app_context():
+                logs = (
+                    Log.query.filter(Log.id > self._last_log_id)
+                    .order_by(Log.id).limit(self.tail_batch_size).all()
+                )
+                sessions = (
+                    PairingSession.query.filter(PairingSession.id > self._last_session_id)
+                    .order_by(PairingSession.id).all()
+                )
+                pending = (
+                    PairingSession.query.filter(PairingSession.id.in_(self._pending_sessions)).all()
+                    if self._pending_sessions else []
+                )
+        except Exception:
+            self._app.logger.exception('Falha ao ler os eventos para o stream SSE')
+            return
+
+        if logs:
+            self._last_log_id = logs[-1].id
+            self.publish('log', [log.to_dict() for log in logs])
+            if len(logs) == self.tail_batch_size:
+                self._next_tail = 0  # há mais logs: continuar no próximo ciclo
+
+        utcnow = datetime.utcnow()
+        changed = [session for session in pending if session.vinculado] + sessions
+        if sessions:
+            self._last_session_id = sessions[-1].id
+        self._pending_sessions = {
+            session.id for session in pending + sessions
+            if not session.vinculado and session.expires_at > utcnow
+        }
+        if changed:
+            self.publish('pairing', [session.to_dict() for session in changed])
+
+    def publish(self, event_type, items):
+        """Publica um ou mais eventos do mesmo tipo (chamado por tail())"""
+        with self._cond:
+            for data in items:
+                self._seq += 1
+                frame = (
+                    f'id: {self.boot}-{self._seq}\n'
+                    f'event: {event_type}\n'
+                    f'data: {json.dumps(data, separators=(",", ":"), default=str)}\n\n'
+                )
+                self._replay.append((self._seq, event_type, data, frame))
+                for subscriber in self._subscribers:
+                    if subscriber.overflowed or not subscriber.accepts(event_type, data):
+                        continue
+                    if len(subscriber.frames) >= subscriber.max_pending:
+                        subscriber.overflowed = True
+                        subscriber.frames.clear()
+                    else:
+                        subscriber.frames.append(frame)
+            self._cond.notify_all()
+
+    def _resume_seq(self, last_event_id):
+        """Sequência a partir da qual retomar, ou None se não for possível"""
+        try:
+            boot, seq = last_event_id.split('-')
+            seq = int(seq)
+        except (AttributeError, ValueError):
+            return None
+        if boot != self.boot or seq > self._seq:
+            return None
+        if seq < self._seq and (not self._replay or self._replay[0][0] > seq + 1):
+            return None
+        return seq
+
+    def stream(self, types=None, pair_token=None, last_event_id=None):
+        """Gerador de frames SSE para um cliente"""
+        subscriber = _Subscriber(set(types or ()), pair_token, self.client_queue_size)
+        with self._cond:
+            if last_event_id:
+                seq = self._resume_seq(last_event_id)
+                if seq is None:
+                    # Ponto de retomada perdido: o cliente deve recarregar o estado
+                    subscriber.frames.append('event: reset\ndata: {}\n\n')
+                else:
+                    for event_seq, event_type, data, frame in self._replay:
+                        if event_seq > seq and subscriber.accepts(event_type, data):
+                            subscriber.frames.append(frame)
+            self._subscribers.add(subscriber)
+
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                with self._cond:
+                    self._cond.wait_for(
+                        lambda: subscriber.frames or subscriber.overflowed,
+                        timeout=self.keepalive
+                    )
+                    if subscriber.overflowed:
+                        return
+                    frames = list(subscriber.frames)
+                    subscriber.frames.clear()
+                if frames:
+                    yield ''.join(frames)
+                else:
+                    yield ': keep-alive\n\n'
+        finally:
+            with self._cond:
+                self._subscribers.discard(subscriber)
+
+
+event_broker = EventBroker()
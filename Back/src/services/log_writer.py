@@ -0,0 +1,215 @@
+import atexit
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from models.user import db, get_brt_now
+from models.log import Log
+from models.spool_checkpoint import SpoolCheckpoint
+from models.denied_card_stat import DeniedCardStat, DENIED_ACTIONS
+from models.daily_access_rollup import DailyAccessRollup
+from services.access_spool import AccessSpool
+
+
+class LogWriter:
+    """Grava logs de acesso em lote numa thread de fundo (write-behind)
+
+    As rotas apenas acrescentam o evento ao spool em disco e respondem; a
+    thread carrega até `batch_size` eventos por transação na tabela `logs`,
+    avançando o checkpoint do segmento na mesma transação. Assim nenhum
+    evento é perdido nem duplicado se o processo cair entre as duas etapas,
+    e um banco lento ou bloqueado não atrasa a validação dos cartões.
+    """
+
+    def __init__(self):
+        self._app = None
+        self._spool = None
+        self._thread = None
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._loaded = threading.Condition()
+        self._loaded_own = 0
+        self._offsets = {}
+        self._ticks = []
+        self.batch_size = 200
+        self.flush_interval = 0.05
+        self.stop_timeout = 5
+        self._stop_deadline = None
+        self.denied_bucket_seconds = 3600
+        self.denied_keep_first = 5
+
+    def init_app(self, app):
+        self._app = app
+        self.batch_size = app.config.get('LOG_WRITER_BATCH_SIZE', 200)
+        self.flush_interval = app.config.get('LOG_WRITER_FLUSH_INTERVAL_MS', 50) / 1000
+        self.stop_timeout = app.config.get('LOG_WRITER_STOP_TIMEOUT', 5)
+        self.denied_bucket_seconds = app.config.get('DENIED_STATS_BUCKET_SECONDS', 3600)
+        self.denied_keep_first = app.config.get('DENIED_STATS_KEEP_FIRST', 5)
+        self._spool = AccessSpool(
+            app.config['LOG_SPOOL_DIR'],
+            app.config.get('LOG_SPOOL_SEGMENT_BYTES', 4 * 1024 * 1024)
+        )
+
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def submit(self, wake=True, **fields):
+        """Registra um evento de acesso no spool; a gravação em `logs` é assíncrona
+
+        Com wake=False o evento não dispara uma carga imediata e segue no
+        próximo lote periódico (usado para eventos de baixa prioridade).
+        """
+        timestamp = fields.pop('timestamp', None) or get_brt_now()
+        fields['timestamp'] = timestamp.isoformat()
+        self._spool.append(fields)
+        if wake:
+            self._wake.set()
+        return fields
+
+    def submit_repeats(self, event, repeats):
+        """Soma `repeats` leituras repetidas ao log do evento devolvido por submit()"""
+        self._spool.append({
+            'repeat_of': event['timestamp'],
+            'nfc_uuid': event['nfc_uuid'],
+            'action': event['action'],
+            'user_id': event.get('user_id'),
+            'repeats': repeats
+        })
+
+    def add_tick(self, callback):
+        """Registra uma função chamada a cada ciclo da thread, antes da carga
+
+        Recebe force=True no último ciclo, durante o desligamento.
+        """
+        self._ticks.append(callback)
+
+    def flush(self, timeout=None):
+        """Bloqueia até que os eventos gravados por este processo estejam em `logs`"""
+        target = self._spool.appended
+        self._wake.set()
+        with self._loaded:
+            return self._loaded.wait_for(lambda: self._loaded_own >= target, timeout)
+
+    def stop(self):
+        """Para a thread após carregar o que restar no spool (chamado no desligamento)
+
+        Se o banco continuar recusando a carga por `stop_timeout` segundos, desiste:
+        os eventos seguem no spool e são carregados na próxima inicialização.
+        """
+        if self._thread is None or self._stopping.is_set():
+            return
+        self._stop_deadline = time.monotonic() + self.stop_timeout
+        self._stopping.set()
+        self._wake.set()
+        # Folga para a última transação em andamento terminar
+        self._thread.join(self.stop_timeout + 5)
+        if self._thread.is_alive():
+            self._app.logger.warning('log-writer não terminou; o spool será recuperado na próxima inicialização')
+            return
+        self._spool.sync()
+        self._spool.close()
+
+    def _run(self):
+        while True:
+            self._wake.wait(timeout=self.flush_interval)
+            self._wake.clear()
+            for tick in self._ticks:
+                tick(force=self._stopping.is_set())
+            caught_up = self._drain()
+            if self._stopping.is_set():
+                if caught_up:
+                    return
+                if time.monotonic() >= self._stop_deadline:
+                    self._app.logger.warning(
+                        'Banco indisponível no desligamento; eventos pendentes ficam no spool para a próxima inicialização'
+                    )
+                    return
+            if not caught_up:
+                # Banco indisponível: os eventos continuam seguros no spool
+                self._stopping.wait(self.flush_interval)
+
+    def _drain(self):
+        """Carrega os segmentos pendentes; retorna False se o banco falhou"""
+        self._spool.sync()
+        with self._app.app_context():
+            for segment in self._spool.segments():
+                try:
+                    if not self._drain_segment(segment):
+                        return False
+                except Exception:
+                    db.session.rollback()
+                    self._app.logger.exception('Falha ao carregar o spool %s em logs', segment)
+                    return False
+        return True
+
+    def _drain_segment(self, segment):
+        offset = self._offsets.get(segment)
+        if offset is None:
+            checkpoint = db.session.get(SpoolCheckpoint, segment)
+            offset = checkpoint.offset if checkpoint else 0
+
+        while True:
+            records, new_offset = self._spool.read(segment, offset, self.batch_size)
+            if new_offset == offset:
+                break
+
+            events = [record for record in records if 'repeats' not in record]
+            if events:
+                for event in events:
+                    event['timestamp'] = datetime.fromisoformat(event['timestamp'])
+                # O rollup conta todas as tentativas, inclusive as que não viram linha
+                DailyAccessRollup.add(events)
+                # Tentativas negadas viram contadores; só as primeiras de cada
+                # janela são gravadas como linhas em `logs`
+                rows = DeniedCardStat.aggregate(events, self.denied_bucket_seconds, self.denied_keep_first)
+                if rows:
+                    db.session.execute(insert(Log.__table__), rows)
+            for record in records:
+                if 'repeats' in record:
+                    self._apply_repeats(record)
+            db.session.merge(SpoolCheckpoint(segment=segment, offset=new_offset))
+            db.session.commit()
+
+            offset = self._offsets[segment] = new_offset
+            if self._spool.is_own(segment):
+                with self._loaded:
+                    self._loaded_own += len(records)
+                    self._loaded.notify_all()
+
+        if self._spool.is_sealed(segment) and offset >= self._spool.size(segment):
+            self._spool.remove(segment)
+            self._offsets.pop(segment, None)
+            db.session.query(SpoolCheckpoint).filter_by(segment=segment).delete()
+            db.session.commit()
+        return True
+
+
+    def _apply_repeats(self, record):
+        timestamp = datetime.fromisoformat(record['repeat_of'])
+        table = Log.__table__
+        db.session.execute(
+            table.update()
+            .where(
+                table.c.nfc_uuid == record['nfc_uuid'],
+                table.c.timestamp == timestamp,
+                table.c.action == record['action']
+            )
+            .values(repeat_count=table.c.repeat_count + record['repeats'])
+        )
+        DailyAccessRollup.add([{
+            'timestamp': timestamp,
+            'action': record['action'],
+            'user_id': record.get('user_id'),
+            'count': record['repeats']
+        }])
+        if record['action'] in DENIED_ACTIONS:
+            DeniedCardStat.add_repeats(
+                record['nfc_uuid'], record['action'], timestamp,
+                record['repeats'], self.denied_bucket_seconds
+            )
+
+
+log_writer = LogWriter()
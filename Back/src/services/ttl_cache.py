@@ -0,0 +1,32 @@
+import threading
+import time
+
+
+class TTLCache:
+    """Cache em memória de resultados que expiram após `ttl` segundos
+
+    Não há invalidação: escritas no banco só aparecem quando a entrada expira,
+    então os resultados podem ficar até `ttl` segundos defasados.
+    """
+
+    def __init__(self, ttl=5, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+        value = compute()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries = {}
+            self._entries[key] = (now + self.ttl, value)
+        return value
+
+
+stats_cache = TTLCache()
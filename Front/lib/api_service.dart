@@ -11,8 +11,35 @@ class ApiService {
   // -------------------------
   // USERS
   // -------------------------
-  static Future<List<User>> getUsers() async {
-    final url = Uri.parse('$base/api/users');
+  /// Todos os usuários, percorrendo as páginas de /api/users (ordem por nome)
+  /// Uma página da listagem ordenada por nome; passe o `nextCursor` da
+  /// página anterior para buscar a seguinte (null na última página)
+  static Future<({List<User> users, String? nextCursor})> getUsers({
+    String? cursor,
+    int limit = 50,
+  }) async {
+    final url = Uri.parse('$base/api/users').replace(queryParameters: {
+      'limit': '$limit',
+      'sort': 'name',
+      if (cursor != null) 'cursor': cursor,
+    });
+    final res = await http.get(url);
+
+    final data = jsonDecode(res.body);
+    if (res.statusCode != 200) {
+      throw Exception(data['error'] ?? 'Erro ao carregar usuários');
+    }
+    final List page = data['users'] ?? [];
+    return (
+      users: page.map((e) => User.fromJson(e)).toList(),
+      nextCursor: data['next_cursor'] as String?,
+    );
+  }
+
+  /// Busca por prefixo no nome, e-mail, telefone ou CPF
+  static Future<List<User>> searchUsers(String query) async {
+    final url = Uri.parse('$base/api/users/search')
+        .replace(queryParameters: {'q': query, 'limit': '50'});
     final res = await http.get(url);
 
     final data = jsonDecode(res.body);
@@ -84,6 +111,32 @@ class ApiService {
     return logs.map((e) => LogEntry.fromJson(e)).toList();
   }
 
+  // -------------------------
+  // STATS
+  // -------------------------
+  static Future<Map<String, dynamic>> getStats() async {
+    final url = Uri.parse('$base/api/stats');
+    final res = await http.get(url);
+
+    if (res.statusCode != 200) {
+      throw Exception('Erro ao carregar estatísticas');
+    }
+
+    return jsonDecode(res.body);
+  }
+
+  /// Histograma de acessos em [buckets] intervalos (padrão: últimos 7 dias)
+  static Future<List<dynamic>> getAccessHistogram({int buckets = 7}) async {
+    final url = Uri.parse('$base/api/stats/histogram?buckets=$buckets');
+    final res = await http.get(url);
+
+    if (res.statusCode != 200) {
+      throw Exception('Erro ao carregar histograma de acessos');
+    }
+
+    return jsonDecode(res.body)['buckets'] ?? [];
+  }
+
   // -------------------------
   // NFC INTEGRATION
   // -------------------------
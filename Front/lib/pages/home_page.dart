@@ -1,7 +1,6 @@
 import 'package:flutter/material.dart';
 import 'dart:async';
 import '../api_service.dart';
-import '../models/user.dart';
 import 'statistics_page.dart';
 
 class HomePage extends StatefulWidget {
@@ -38,15 +37,14 @@ class _HomePageState extends State<HomePage> {
 
   Future<void> _loadStats() async {
     try {
-      final users = await ApiService.getUsers();
+      final stats = await ApiService.getStats();
+      final userStats = stats['users'] ?? {};
 
       if (mounted) {
         setState(() {
-          totalUsers = users.length;
-          usersWithNfc = users
-              .where((u) => u.nfcCardUuid != null && u.nfcCardUuid!.isNotEmpty)
-              .length;
-          usersWithoutNfc = totalUsers - usersWithNfc;
+          totalUsers = userStats['total'] ?? 0;
+          usersWithNfc = userStats['with_nfc'] ?? 0;
+          usersWithoutNfc = userStats['without_nfc'] ?? 0;
           loading = false;
         });
       }
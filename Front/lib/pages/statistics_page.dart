@@ -2,8 +2,6 @@ import 'package:flutter/material.dart';
 import 'dart:async';
 import 'dart:math' as math;
 import '../api_service.dart';
-import '../models/user.dart';
-import '../models/log_entry.dart';
 import 'package:intl/intl.dart';
 import 'dart:ui' as ui;
 
@@ -16,8 +14,6 @@ class StatisticsPage extends StatefulWidget {
 
 class _StatisticsPageState extends State<StatisticsPage> {
   bool loading = true;
-  List<User> users = [];
-  List<LogEntry> logs = [];
   Timer? _refreshTimer;
 
   // Estatísticas
@@ -47,14 +43,13 @@ class _StatisticsPageState extends State<StatisticsPage> {
 
   Future<void> _loadData() async {
     try {
-      final fetchedUsers = await ApiService.getUsers();
-      final fetchedLogs = await ApiService.getLogs();
+      final stats = await ApiService.getStats();
+      final histogram = await ApiService.getAccessHistogram();
 
       if (mounted) {
         setState(() {
-          users = fetchedUsers;
-          logs = fetchedLogs;
-          _calculateStatistics();
+          _applyStatistics(stats);
+          _applyHistogram(histogram);
           loading = false;
         });
       }
@@ -65,36 +60,27 @@ class _StatisticsPageState extends State<StatisticsPage> {
     }
   }
 
-  void _calculateStatistics() {
+  // Estatísticas agregadas pelo backend (GET /api/stats)
+  void _applyStatistics(Map<String, dynamic> stats) {
     // Estatísticas de usuários
-    totalUsers = users.length;
-    usersWithNfc = users
-        .where((u) => u.nfcCardUuid != null && u.nfcCardUuid!.isNotEmpty)
-        .length;
-    usersWithoutNfc = totalUsers - usersWithNfc;
+    final userStats = stats['users'] ?? {};
+    totalUsers = userStats['total'] ?? 0;
+    usersWithNfc = userStats['with_nfc'] ?? 0;
+    usersWithoutNfc = userStats['without_nfc'] ?? 0;
 
     // Estatísticas de acessos
-    totalAccesses = logs.length;
-    authorizedAccesses = logs.where((l) => l.userExists).length;
-    deniedAccesses = logs.where((l) => !l.userExists).length;
+    final logStats = stats['logs'] ?? {};
+    totalAccesses = logStats['total'] ?? 0;
+    authorizedAccesses = logStats['authorized'] ?? 0;
+    deniedAccesses = logStats['denied'] ?? 0;
+  }
 
-    // Acessos por dia (últimos 7 dias)
+  // Acessos por dia (últimos 7 dias, um bucket por dia de GET /api/stats/histogram)
+  void _applyHistogram(List<dynamic> buckets) {
     accessesByDay = {};
-    final now = DateTime.now();
-
-    for (var i = 6; i >= 0; i--) {
-      final date = now.subtract(Duration(days: i));
-      final dateKey = DateFormat('dd/MM').format(date);
-      accessesByDay[dateKey] = 0;
-    }
-
-    for (var log in logs) {
-      final logDate = DateTime.parse(log.timestamp);
-      final dateKey = DateFormat('dd/MM').format(logDate);
-
-      if (accessesByDay.containsKey(dateKey)) {
-        accessesByDay[dateKey] = accessesByDay[dateKey]! + 1;
-      }
+    for (var bucket in buckets) {
+      final dateKey = DateFormat('dd/MM').format(DateTime.parse(bucket['start']));
+      accessesByDay[dateKey] = bucket['total'] ?? 0;
     }
   }
 
@@ -1,3 +1,4 @@
+import 'dart:async';
 import 'package:flutter/material.dart';
 import '../models/user.dart';
 import '/api_service.dart';
@@ -14,40 +15,97 @@ class _UsersPageState extends State<UsersPage> {
   List<User> users = [];
   List<User> filtered = [];
   bool loading = false;
+  bool loadingMore = false;
+  String? nextCursor;
   String search = "";
+  Timer? _searchDebounce;
+  final _scroll = ScrollController();
 
   @override
   void initState() {
     super.initState();
+    _scroll.addListener(_onScroll);
     fetchUsers();
   }
 
+  @override
+  void dispose() {
+    _searchDebounce?.cancel();
+    _scroll.dispose();
+    super.dispose();
+  }
+
+  // Recarrega a partir da primeira página
   Future<void> fetchUsers() async {
     setState(() => loading = true);
 
     try {
-      users = await ApiService.getUsers();
+      final page = await ApiService.getUsers();
+      users = page.users;
+      nextCursor = page.nextCursor;
       filter();
     } catch (e) {
       _error(e.toString());
     }
 
     setState(() => loading = false);
+    _fillViewport();
   }
 
-  void filter() {
-    setState(() {
-      filtered = users
-          .where(
-            (u) =>
-                u.name.toLowerCase().contains(search.toLowerCase()) ||
-                u.cpf.contains(search) ||
-                u.email.toLowerCase().contains(search.toLowerCase()),
-          )
-          .toList();
+  // Próxima página quando a rolagem chega perto do fim da lista
+  void _onScroll() {
+    if (_scroll.position.extentAfter < 300) fetchMore();
+  }
+
+  // Uma página que não enche a tela não gera rolagem: continua carregando
+  void _fillViewport() {
+    WidgetsBinding.instance.addPostFrameCallback((_) {
+      if (mounted && _scroll.hasClients) _onScroll();
     });
   }
 
+  Future<void> fetchMore() async {
+    final cursor = nextCursor;
+    if (cursor == null || loadingMore || loading || search.trim().isNotEmpty) {
+      return;
+    }
+    setState(() => loadingMore = true);
+
+    try {
+      final page = await ApiService.getUsers(cursor: cursor);
+      // Ignora a página se a lista foi recarregada enquanto ela chegava
+      if (mounted && cursor == nextCursor) {
+        users = [...users, ...page.users];
+        nextCursor = page.nextCursor;
+        filter();
+      }
+    } catch (e) {
+      if (mounted) _error(e.toString());
+    }
+
+    if (!mounted) return;
+    setState(() => loadingMore = false);
+    _fillViewport();
+  }
+
+  // Busca no servidor (GET /api/users/search); sem texto mostra todos
+  Future<void> filter() async {
+    final query = search.trim();
+    if (query.isEmpty) {
+      setState(() => filtered = users);
+      return;
+    }
+
+    try {
+      final results = await ApiService.searchUsers(query);
+      // Ignora respostas de buscas que já foram substituídas
+      if (!mounted || query != search.trim()) return;
+      setState(() => filtered = results);
+    } catch (e) {
+      _error(e.toString());
+    }
+  }
+
   @override
   Widget build(BuildContext context) {
     return Column(
@@ -71,11 +129,12 @@ class _UsersPageState extends State<UsersPage> {
         TextField(
           decoration: const InputDecoration(
             prefixIcon: Icon(Icons.search),
-            hintText: "Buscar por nome, CPF ou email...",
+            hintText: "Buscar por nome, CPF, email ou telefone...",
           ),
           onChanged: (v) {
             search = v;
-            filter();
+            _searchDebounce?.cancel();
+            _searchDebounce = Timer(const Duration(milliseconds: 250), filter);
           },
         ),
         const SizedBox(height: 20),
@@ -86,8 +145,15 @@ class _UsersPageState extends State<UsersPage> {
               : filtered.isEmpty
               ? const Center(child: Text("Nenhum usuário encontrado"))
               : ListView.builder(
-                  itemCount: filtered.length,
+                  controller: _scroll,
+                  itemCount: filtered.length + (loadingMore ? 1 : 0),
                   itemBuilder: (ctx, i) {
+                    if (i == filtered.length) {
+                      return const Padding(
+                        padding: EdgeInsets.all(16),
+                        child: Center(child: CircularProgressIndicator()),
+                      );
+                    }
                     final u = filtered[i];
                     return Card(
                       child: ListTile(